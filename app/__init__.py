@@ -10,7 +10,13 @@ from app.routes.image import image_bp
 from app.routes.order import order_bp
 from app.routes.discount import discount_bp
 from app.routes.cart import cart_bp
+from app.routes.report import report_bp
 from app.models import User, UserRole
+from app.commands import register_commands
+from app.services.category_service import ensure_category_closure
+from app.services.stats_service import ensure_product_stats
+from app.services.search_service import init_search_index
+from app.services.product_service import product_detail_cache
 from werkzeug.security import generate_password_hash
 from flasgger import Swagger
 import yaml
@@ -42,6 +48,12 @@ def create_app():
     jwt.init_app(app)
     mail.init_app(app)
 
+    product_detail_cache.configure(
+        maxsize=app.config["PRODUCT_CACHE_SIZE"],
+        ttl=app.config["PRODUCT_CACHE_TTL"],
+        stale_ttl=app.config["PRODUCT_CACHE_STALE_TTL"]
+    )
+
     migrate = Migrate(app, db)
     with open("docs/swagger.yaml", "r",encoding="utf-8") as file:
         swagger_template = yaml.safe_load(file)
@@ -51,6 +63,9 @@ def create_app():
     with app.app_context():
         db.create_all()
         create_admin()
+        ensure_category_closure()
+        ensure_product_stats()
+        init_search_index()
         print("Database created successfully!")
 
     app.register_blueprint(user_bp, url_prefix="/api/user")
@@ -62,6 +77,9 @@ def create_app():
     app.register_blueprint(order_bp, url_prefix="/api/order")
     app.register_blueprint(cart_bp, url_prefix="/api/cart")
     app.register_blueprint(discount_bp, url_prefix="/api/discount")
+    app.register_blueprint(report_bp, url_prefix="/api/report")
+
+    register_commands(app)
 
     return app
 
@@ -0,0 +1,104 @@
+import click
+from datetime import date
+from app.services.stats_service import rebuild_product_stats
+from app.services.category_service import rebuild_category_closure
+from app.services.import_service import import_products, detect_import_format
+from app.utils.idempotency import purge_expired_idempotency_keys
+from app.services.job_service import run_worker, prune_jobs
+from app.services.report_service import rebuild_daily_rollups
+from app.services.reservation_service import release_expired_reservations, run_reservation_sweeper
+from app.services.export_service import EXPORTS, generate_export, parse_since, validate_since
+
+
+def register_commands(app):
+    @app.cli.command("rebuild-product-stats")
+    def rebuild_product_stats_command():
+        """Tính lại rating, số đánh giá và số lượng đã bán của mọi sản phẩm."""
+        count = rebuild_product_stats()
+        click.echo(f"Rebuilt stats for {count} products")
+
+    @app.cli.command("rebuild-category-closure")
+    def rebuild_category_closure_command():
+        """Dựng lại bảng closure của cây danh mục từ cột parent_id."""
+        count = rebuild_category_closure()
+        click.echo(f"Rebuilt closure for {count} categories")
+
+    @app.cli.command("backfill-daily-rollups")
+    @click.option("--since", default=None, help="Chỉ tính lại từ ngày ISO này (mặc định toàn bộ).")
+    def backfill_daily_rollups_command(since):
+        """Tính lại các bảng tổng hợp doanh số theo ngày từ các đơn đã hoàn thành."""
+        try:
+            since = date.fromisoformat(since) if since else None
+        except ValueError:
+            raise click.BadParameter("use an ISO date", param_hint="--since")
+        count = rebuild_daily_rollups(since)
+        click.echo(f"Rebuilt rollups for {count} days")
+
+    @app.cli.command("worker")
+    @click.option("--concurrency", default=4, show_default=True, help="Số luồng xử lý job.")
+    @click.option("--poll-interval", default=1.0, show_default=True, help="Số giây chờ khi không có job.")
+    @click.option("--once", is_flag=True, help="Dừng khi hàng đợi không còn job đến hạn.")
+    def worker_command(concurrency, poll_interval, once):
+        """Chạy worker xử lý hàng đợi job (email, cảnh báo tồn kho...)."""
+        count = run_worker(app, concurrency=concurrency, poll_interval=poll_interval, once=once)
+        click.echo(f"Processed {count} jobs")
+
+    @app.cli.command("prune-jobs")
+    @click.option("--days", default=7, show_default=True)
+    @click.option("--include-failed", is_flag=True)
+    def prune_jobs_command(days, include_failed):
+        """Xóa các job đã xử lý xong cũ hơn số ngày chỉ định."""
+        count = prune_jobs(days, include_failed)
+        click.echo(f"Deleted {count} jobs")
+
+    @app.cli.command("purge-idempotency-keys")
+    def purge_idempotency_keys_command():
+        """Xóa các Idempotency-Key đã hết hạn."""
+        count = purge_expired_idempotency_keys()
+        click.echo(f"Deleted {count} expired idempotency keys")
+
+    @app.cli.command("release-expired-reservations")
+    def release_expired_reservations_command():
+        """Xóa các lượt giữ hàng đã hết hạn."""
+        count = release_expired_reservations()
+        click.echo(f"Released {count} expired reservations")
+
+    @app.cli.command("reservations-sweep")
+    @click.option("--interval", default=None, type=int, help="Số giây giữa hai lần dọn (mặc định RESERVATION_SWEEP_INTERVAL).")
+    def reservations_sweep_command(interval):
+        """Chạy liên tục, dọn các lượt giữ hàng đã hết hạn theo chu kỳ."""
+        if interval is None:
+            interval = app.config["RESERVATION_SWEEP_INTERVAL"]
+        if interval <= 0:
+            raise click.BadParameter("must be a positive number of seconds", param_hint="--interval")
+        run_reservation_sweeper(app, interval)
+
+    @app.cli.command("import-products")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None)
+    @click.option("--batch-size", default=1000, show_default=True)
+    def import_products_command(path, fmt, batch_size):
+        """Nhập sản phẩm hàng loạt từ file CSV hoặc JSONL."""
+        fmt = detect_import_format(path, fmt)
+        if not fmt:
+            raise click.UsageError("Unsupported file format, use --format csv or jsonl")
+        with open(path, "rb") as file:
+            report = import_products(file, fmt, batch_size=batch_size)
+        for error in report["errors"]:
+            click.echo(f"row {error['row']}: {error['error']}", err=True)
+        click.echo(f"Inserted {report['inserted']} products, {report['failed']} rows failed")
+
+    @app.cli.command("export")
+    @click.argument("name", type=click.Choice(sorted(EXPORTS)))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+    @click.option("--since", default=None, help="Chỉ xuất bản ghi có id lớn hơn hoặc created_at từ ngày ISO này.")
+    @click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-")
+    def export_command(name, fmt, since, output):
+        """Xuất products, orders hoặc reviews ra CSV/JSONL."""
+        try:
+            since = parse_since(since)
+            validate_since(name, since)
+        except ValueError:
+            raise click.BadParameter("use an id or an ISO date", param_hint="--since")
+        for chunk in generate_export(name, fmt, since):
+            output.write(chunk)
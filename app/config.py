@@ -21,6 +21,22 @@ class Config:
 
     UPLOAD_FOLDER = UPLOAD_FOLDER
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+
+    PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 2048))
+    PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 60))
+    PRODUCT_CACHE_STALE_TTL = int(os.getenv("PRODUCT_CACHE_STALE_TTL", 30))
+
+    RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", 600))
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv("RESERVATION_SWEEP_INTERVAL", 60))
+
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_BACKOFF_BASE = int(os.getenv("JOB_BACKOFF_BASE", 10))
+    JOB_BACKOFF_MAX = int(os.getenv("JOB_BACKOFF_MAX", 3600))
+    JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", 600))
+    LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", 5))
+
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
  
 
     MAIL_SERVER = "smtp.gmail.com"
@@ -4,6 +4,12 @@ from datetime import datetime
 import enum
 import random
 
+class JobStatus(enum.Enum):
+    pending = "Pending"
+    running = "Running"
+    done = "Done"
+    failed = "Failed"
+
 class UserRole(enum.Enum):
     admin = "Admin"
     staff = "Staff"
@@ -70,6 +76,11 @@ class Category(db.Model):
     parent = relationship("Category", remote_side=[id], backref="subcategories")
     products = relationship("Product", back_populates="category", cascade="all, delete-orphan", passive_deletes=True)
 
+class CategoryClosure(db.Model):
+    ancestor_id = db.Column(db.Integer, db.ForeignKey("category.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey("category.id", ondelete="CASCADE"), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -87,6 +98,21 @@ class Product(db.Model):
     images = relationship("ProductImage", back_populates="product", cascade="all, delete-orphan", passive_deletes=True)
     order_items = relationship("OrderItem", back_populates="product", passive_deletes=True)
     cart_items = relationship("CartItem", backref="product", passive_deletes=True)
+    stats = relationship("ProductStats", uselist=False, back_populates="product", cascade="all, delete-orphan", passive_deletes=True)
+
+class ProductStats(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), primary_key=True)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    sold_quantity = db.Column(db.Integer, nullable=False, default=0)
+
+    product = relationship("Product", back_populates="stats")
+
+    @property
+    def avg_rating(self):
+        if not self.review_count:
+            return 0
+        return self.rating_sum / self.review_count
 
 class ProductImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,6 +132,11 @@ class Order(db.Model):
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan", passive_deletes=True)
 
+    __table_args__ = (
+        db.Index("ix_order_status_created_at", "status", "created_at"),
+        db.Index("ix_order_user_id_created_at", "user_id", "created_at"),
+    )
+
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey("order.id", ondelete="CASCADE"), nullable=False)
@@ -117,12 +148,28 @@ class OrderItem(db.Model):
     order = relationship("Order", back_populates="order_items")
     product = relationship("Product", back_populates="order_items")
 
+    __table_args__ = (
+        db.Index("ix_order_item_product_id", "product_id"),
+    )
+
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
 
+class StockReservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_stock_reservation_product_expires", "product_id", "expires_at"),
+    )
+
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
@@ -141,12 +188,13 @@ class Discount(db.Model):
     expiration_date = db.Column(db.DateTime, nullable=False)
     max_users = db.Column(db.Integer, nullable=True)
     minimum_order_value = db.Column(db.Float, nullable=True)
+    collected_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     users_collected = relationship('UserDiscount', backref='discount', cascade="all, delete-orphan", passive_deletes=True)
 
     def is_valid(self):
         return self.release_date <= datetime.utcnow() <= self.expiration_date and \
-               (self.max_users is None or len(self.users_collected) < self.max_users)
+               (self.max_users is None or self.collected_count < self.max_users)
 
 class UserDiscount(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -154,9 +202,70 @@ class UserDiscount(db.Model):
     discount_id = db.Column(db.Integer, db.ForeignKey('discount.id', ondelete="CASCADE"), nullable=False)
     is_used = db.Column(db.Boolean, default=False, nullable=False)
 
+    __table_args__ = (
+        db.Index("uq_user_discount_user_id_discount_id", "user_id", "discount_id", unique=True),
+    )
+
     def use_discount(self):
         if not self.is_used:
             self.is_used = True
             db.session.commit()
             return True
         return False
+
+# Các bảng tổng hợp theo ngày (ngày tạo đơn) của các đơn đã hoàn thành, dùng cho báo cáo
+class DailySales(db.Model):
+    date = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class DailyProductSales(db.Model):
+    date = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id", ondelete="CASCADE"), primary_key=True, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class DailyCategorySales(db.Model):
+    date = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id", ondelete="CASCADE"), primary_key=True, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class DailyDiscountUsage(db.Model):
+    date = db.Column(db.Date, primary_key=True)
+    discount_id = db.Column(db.Integer, primary_key=True, index=True)
+    usage_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.pending)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_job_status_run_at", "status", "run_at"),
+    )
+
+# Kết quả đã lưu của request có header Idempotency-Key; key_hash = sha256(user, method, path, key).
+# status_code NULL nghĩa là request đầu tiên đang được xử lý.
+class IdempotencyKey(db.Model):
+    key_hash = db.Column(db.String(64), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class DataVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from app.models import CartItem, Product
-from app.services.product_service import get_product_with_details
+from app.models import CartItem
+from app.services.product_service import get_products_with_details
+from app.services.reservation_service import available_to_sell
 from app.extensions import db
 from app.utils.security import active_required
+from app.utils.streaming import iter_batches, stream_json_array
 
 cart_bp = Blueprint("cart", __name__)
 
@@ -15,10 +17,11 @@ def get_cart():
         return jsonify({"error": "invalid user"}), 403
 
     cart_items = CartItem.query.filter_by(user_id=user_id).all()
+    products = {p["id"]: p for p in get_products_with_details([item.product_id for item in cart_items])}
     result = [
         {
             "id": item.id,
-            "product": get_product_with_details(item.product_id),
+            "product": products.get(item.product_id),
             "quantity": item.quantity
         }
         for item in cart_items
@@ -37,8 +40,8 @@ def add_to_cart():
     if not product_id:
         return jsonify({"error": "product_id is required"}), 400
 
-    product = Product.query.get(product_id)
-    if not product or product.stock < quantity:
+    available = available_to_sell([product_id], exclude_user_id=user_id).get(product_id)
+    if available is None or available < quantity:
         return jsonify({"error": "Product not available or insufficient stock"}), 400
 
     cart_item = CartItem.query.filter_by(user_id=user_id, product_id=product_id).first()
@@ -47,7 +50,7 @@ def add_to_cart():
         return jsonify({"message": "Forbidden: invalid user"}), 403
 
     if cart_item:
-        if product.stock < cart_item.quantity + quantity:
+        if available < cart_item.quantity + quantity:
             return jsonify({"error": "Not enough stock available"}), 400
         cart_item.quantity += quantity
     else:
@@ -76,11 +79,11 @@ def update_cart(cart_item_id):
     if cart_item.user_id != identity["id"]:
         return jsonify({"message": "Forbidden: invalid user"}), 403
 
-    product = Product.query.get(cart_item.product_id)
-    if not product:
+    available = available_to_sell([cart_item.product_id], exclude_user_id=identity["id"]).get(cart_item.product_id)
+    if available is None:
         return jsonify({"error": "Product not found"}), 404
 
-    if quantity > product.stock:
+    if quantity > available:
         return jsonify({"error": "Insufficient stock"}), 400
 
     cart_item.quantity = quantity
@@ -110,14 +113,14 @@ def remove_from_cart(cart_item_id):
 @jwt_required()
 @active_required()
 def get_cart_items():
-    cart_items = CartItem.query.all()
-    result = []
-    for item in cart_items:
-        result.append({
-            "cart_item_id": item.id,
-            "user_id": item.user_id,
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-        })
-
-    return jsonify({"cart_items": result}), 200
+    def generate():
+        for cart_items in iter_batches(CartItem.query, CartItem.id):
+            for item in cart_items:
+                yield {
+                    "cart_item_id": item.id,
+                    "user_id": item.user_id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                }
+
+    return stream_json_array(generate(), wrap_key="cart_items")
@@ -2,20 +2,24 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.utils.security import role_required, active_required
 from app.extensions import db
-from app.models import Category, UserRole
+from app.models import Category, Product, UserRole
+from app.services.category_service import insert_category_closure, move_category, delete_category_closure, get_category_tree, category_changed, CATEGORY_VERSION
+from app.utils.etag import versioned_etag
 
 category_bp = Blueprint("category", __name__)
 
 # Lấy danh sách danh mục
 @category_bp.route("/categories", methods=["GET"])
+@versioned_etag(CATEGORY_VERSION)
 def get_categories():
-    parent_id = request.args.get("parent_id") 
-    
-    query = Category.query
+    parent_id = request.args.get("parent_id", type=int)
+
+    tree = get_category_tree()
     if parent_id:
-        query = query.filter_by(parent_id=parent_id)
+        categories = tree.children_of(parent_id)
+    else:
+        categories = tree.nodes.values()
 
-    categories = query.all()
     result = [
         {
             "id": category.id,
@@ -52,6 +56,9 @@ def add_category():
 
     new_category = Category(name=name, parent_id=parent_id)
     db.session.add(new_category)
+    db.session.flush()
+    insert_category_closure(new_category)
+    category_changed()
     db.session.commit()
 
     return jsonify({"message": "Category added successfully"}), 201
@@ -76,17 +83,29 @@ def update_category(category_id):
     if not name and not parent_id:
         return jsonify({"message": "notthing to update"}), 304
 
+    if not parent_id:
+        parent_id = None
+    else:
+        # parent_id lấy từ JSON có thể là chuỗi ("3"), chuẩn hóa về int trước khi so sánh
+        try:
+            parent_id = int(parent_id)
+        except (TypeError, ValueError):
+            return jsonify({"message": "parent_id must be an integer"}), 400
+
+    if parent_id != category.parent_id:
+        if parent_id and not Category.query.get(parent_id):
+            return jsonify({"message": "Parent category does not exist"}), 400
+        error = move_category(category, parent_id)
+        if error:
+            db.session.rollback()
+            return jsonify({"message": error}), 400
+
     category.name = name
-    category.parent_id = parent_id
+    category_changed()
     db.session.commit()
 
     return jsonify({"message": "Category updated successfully"}), 200
 
-def set_null_parent_id(category_id):
-    category = Category.query.get(category_id)
-    category.parent_id = None
-    db.session.commit()
-
 
 # Xóa danh mục (Chỉ Admin)
 @category_bp.route("/delete-category/<int:category_id>", methods=["DELETE"])
@@ -98,17 +117,12 @@ def delete_category(category_id):
     if not category:
         return jsonify({"message": "Category not found"}), 404
 
-    if category.subcategories:
-        for subcategory in category.subcategories:
-            try:
-                set_null_parent_id(subcategory.id)
-            except Exception:
-                pass
-
-    if category.products:
+    if Product.query.filter_by(category_id=category_id).first():
         return jsonify({"message": "Cannot delete category with products"}), 400
 
+    delete_category_closure(category)
     db.session.delete(category)
+    category_changed()
     db.session.commit()
 
     return jsonify({"message": "Category deleted successfully"}), 200
@@ -5,40 +5,38 @@ from flask_jwt_extended import get_jwt_identity, jwt_required
 from app.utils.security import role_required, active_required
 
 from app.models import Discount, UserDiscount, UserRole
+from app.services.discount_service import (
+    discount_rules_changed, collect_user_discount, discount_listing_query, serialize_discount_row, DISCOUNT_VERSION
+)
+from app.utils.etag import versioned_etag
+from app.utils.idempotency import idempotent
+from app.utils.pagination import get_page_args, is_paginated_request, keyset_paginate, page_response
 
 
 discount_bp = Blueprint("discount", __name__)
 
 @discount_bp.route("/list", methods=["GET"])
+@versioned_etag(DISCOUNT_VERSION, time_bucket=60)
 def get_discounts():
     available_filter = request.args.get("available_filter", "false").lower() == "true"
-    if available_filter:
-        current_time = datetime.utcnow()
-        discounts = Discount.query.filter(Discount.release_date <= current_time, Discount.expiration_date >= current_time).all()
-    else:
-        discounts = Discount.query.all()
+    query = discount_listing_query(available_filter)
 
-    result = []
-
-    for d in discounts:
-        result.append({
-            "id": d.id,
-            "code": d.code,
-            "discount_percent": d.discount_percent,
-            "release_date": d.release_date,
-            "expiration_date": d.expiration_date,
-            "max_users": d.max_users,
-            "minimum_order_value": d.minimum_order_value,
-            "collected_users": len(d.users_collected),
-            "is_valid": d.is_valid()
-        })
+    if is_paginated_request():
+        limit, cursor, with_total = get_page_args()
+        try:
+            page = keyset_paginate(query, [Discount.id], limit, cursor, with_total=with_total)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        return jsonify(page_response(page, "discounts", [serialize_discount_row(row) for row in page.items])), 200
 
+    result = [serialize_discount_row(row) for row in query.order_by(Discount.id).all()]
     return jsonify(result), 200
 
 
 @discount_bp.route("/collect/<int:discount_id>", methods=["POST"])
 @jwt_required()
 @active_required()
+@idempotent()
 def collect_discount(discount_id):
     user_id = get_jwt_identity()["id"]
     discount = Discount.query.get(discount_id)
@@ -46,16 +44,9 @@ def collect_discount(discount_id):
     if not discount:
         return jsonify({"message": "Discount not found"}), 404
 
-    if not discount.is_valid():
-        return jsonify({"message": "Discount is no longer available"}), 400
-
-    existing_user_discount = UserDiscount.query.filter_by(user_id=user_id, discount_id=discount_id).first()
-    if existing_user_discount:
-        return jsonify({"message": "You have already collected this discount"}), 400
-
-    new_user_discount = UserDiscount(user_id=user_id, discount_id=discount_id)
-    db.session.add(new_user_discount)
-    db.session.commit()
+    _, error = collect_user_discount(user_id, discount_id)
+    if error:
+        return jsonify({"message": error}), 400
 
     return jsonify({"message": "Discount collected successfully"}), 201
 
@@ -91,6 +82,7 @@ def delete_discount(discount_id):
         return jsonify({"message": "Discount not found"}), 404
 
     db.session.delete(discount)
+    discount_rules_changed()
     db.session.commit()
 
     return jsonify({"message": "Discount deleted successfully"}), 200
@@ -124,6 +116,7 @@ def create_discount():
     )
 
     db.session.add(new_discount)
+    discount_rules_changed()
     db.session.commit()
 
     return jsonify({"message": "Discount created successfully", "discount_id": new_discount.id}), 201
@@ -1,16 +1,81 @@
 from app.extensions import db
 from flask import jsonify, Blueprint, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from app.models import CartItem, Order, OrderItem, OrderStatus, User, UserDiscount, UserRole, Product
+from app.models import Order, OrderStatus, User, UserRole
 from app.utils.security import role_required, active_required
+from app.utils.idempotency import idempotent, after_commit
+from app.utils.streaming import iter_batches, stream_json_array
+from app.utils.pagination import get_page_args, is_paginated_request, keyset_paginate, page_response
 
 order_bp = Blueprint("order", __name__)
 
-from app.services.order_service import  calculate_order_items_total, get_order_item_image
+from app.services.order_service import  place_order, with_order_items, serialize_orders, parse_order_filters, order_filter_conditions, restock_orders, RESTOCK_STATUSES
+from app.services.stats_service import order_status_changed
+from app.services.notification_service import order_status_updated
+from app.services.product_service import invalidate_product_details
+from app.services.export_service import export_response
+from app.services.reservation_service import reserve_items, get_user_reservations, release_user_reservations
+
+def serialize_reservation(reservation):
+    return {
+        "product_id": reservation.product_id,
+        "quantity": reservation.quantity,
+        "expires_at": reservation.expires_at.isoformat()
+    }
+
+# Bắt đầu thanh toán: giữ hàng trong RESERVATION_TTL giây cho order_items hoặc toàn bộ giỏ hàng
+@order_bp.route("/checkout", methods=["POST"])
+@jwt_required()
+@active_required()
+def start_checkout():
+    user_id = get_jwt_identity()["id"]
+    data = request.get_json(silent=True) or {}
+    order_items_data = data.get("order_items")
+
+    items = None
+    if order_items_data is not None:
+        if not isinstance(order_items_data, list) or not order_items_data:
+            return jsonify({"message": "order_items must be a non-empty list"}), 400
+        items = {}
+        for item in order_items_data:
+            product_id = item.get("product_id") if isinstance(item, dict) else None
+            quantity = item.get("quantity", 1) if isinstance(item, dict) else None
+            if not isinstance(product_id, int) or not isinstance(quantity, int) or quantity <= 0:
+                return jsonify({"message": f"Invalid product_id or quantity in item: {item}"}), 400
+            items[product_id] = items.get(product_id, 0) + quantity
+
+    expires_at, error = reserve_items(user_id, items)
+    if error:
+        return jsonify({"message": error}), 400
+
+    return jsonify({
+        "message": "Items reserved",
+        "expires_at": expires_at.isoformat(),
+        "reservations": [serialize_reservation(r) for r in get_user_reservations(user_id)]
+    }), 201
+
+# Xem các lượt giữ hàng còn hạn của user
+@order_bp.route("/checkout", methods=["GET"])
+@jwt_required()
+@active_required()
+def get_checkout():
+    user_id = get_jwt_identity()["id"]
+    return jsonify({"reservations": [serialize_reservation(r) for r in get_user_reservations(user_id)]}), 200
+
+# Hủy thanh toán, trả lại hàng đang giữ
+@order_bp.route("/checkout", methods=["DELETE"])
+@jwt_required()
+@active_required()
+def cancel_checkout():
+    user_id = get_jwt_identity()["id"]
+    release_user_reservations(user_id)
+    db.session.commit()
+    return jsonify({"message": "Reservations released"}), 200
 
 @order_bp.route("/create", methods=["POST"])
 @jwt_required()
 @active_required()
+@idempotent()
 def create_order():
     user_id = get_jwt_identity()["id"]
     user = User.query.get(user_id)
@@ -23,40 +88,16 @@ def create_order():
     if not order_items_data:
         return jsonify({"message": "No order items provided"}), 400
 
-    order_items, total_price, error = calculate_order_items_total(order_items_data, user_id)
+    order, error = place_order(user_id, order_items_data)
     if error:
         return jsonify({"message": error}), 400
 
-    new_order = Order(user_id=user_id, total_price=total_price, status=OrderStatus.pending)
-    db.session.add(new_order)
-    db.session.commit()
-
-    for item in order_items:
-        order_item = OrderItem(
-            order_id=new_order.id,
-            product_id=item["product_id"],
-            quantity=item["quantity"],
-            price=item["price"],
-            discount_id=item["discount_id"]
-        )
-        db.session.add(order_item)
-    db.session.commit()
-
-    for item in order_items:
-        product = Product.query.get(item["product_id"])
-        if product:
-            product.stock -= item["quantity"]
-            db.session.commit()
-
-    for item in order_items:
-        cart_item = CartItem.query.filter_by(user_id=user_id, product_id=item["product_id"]).first()
-        db.session.delete(cart_item)
-    db.session.commit()
+    after_commit(invalidate_product_details, *{item["product_id"] for item in order_items_data})
 
     return jsonify({
         "message": "Order created successfully",
-        "order_id": new_order.id,
-        "total_price": total_price
+        "order_id": order.id,
+        "total_price": order.total_price
     }), 201
 
 
@@ -73,8 +114,11 @@ def cancel_order(order_id):
     if order.status != OrderStatus.pending:
         return jsonify({"message": "Order cannot be canceled"}), 400
 
-    order.status = OrderStatus.canceled
-    db.session.commit()
+    # Kiểm tra lại pending trên dòng đã khóa: nhân viên có thể vừa chuyển đơn sang trạng thái khác
+    restocked_ids, product_ids = restock_orders([order.id], OrderStatus.canceled, [OrderStatus.pending])
+    if not restocked_ids:
+        return jsonify({"message": "Order cannot be canceled"}), 409
+    invalidate_product_details(*product_ids)
 
     return jsonify({"message": "Order canceled successfully"}), 200
 
@@ -94,40 +138,74 @@ def update_order_status(order_id):
     if not order:
         return jsonify({"message": "Order not found"}), 404
 
-    order.status = OrderStatus[new_status.lower()]
+    old_status = order.status
+    status = OrderStatus[new_status.lower()]
+    if old_status in RESTOCK_STATUSES and status != old_status:
+        return jsonify({"message": "Order has already been restocked and cannot be reopened"}), 400
+
+    if status in RESTOCK_STATUSES and old_status != status:
+        restocked_ids, product_ids = restock_orders([order.id], status, [old_status])
+        if not restocked_ids:
+            return jsonify({"message": "Order status was changed by another request"}), 409
+        invalidate_product_details(*product_ids)
+        return jsonify({"message": "Order status updated successfully"}), 200
+
+    order.status = status
+    order_status_changed(order, old_status, order.status)
+    if old_status != order.status:
+        order_status_updated(order)
     db.session.commit()
+    if old_status != order.status and OrderStatus.completed in (old_status, order.status):
+        invalidate_product_details(*[item.product_id for item in order.order_items])
 
-    if new_status == OrderStatus.canceled:
-        user_discount = UserDiscount.query.filter_by(user_id=order.user_id, discount_id=order.discount_id, is_used=True).first()
-        if user_discount:
-            user_discount.is_used = False
-            db.session.commit()
     return jsonify({"message": "Order status updated successfully"}), 200
 
+MAX_RESTOCK_BATCH = 1000
+
+# Hủy hoặc trả hàng nhiều đơn cùng lúc và hoàn kho trong một transaction
+@order_bp.route("/admin/restock", methods=["PUT"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def admin_restock_orders():
+    data = request.get_json(silent=True) or {}
+    order_ids = data.get("order_ids")
+    status = data.get("status", OrderStatus.canceled.value)
+
+    if not isinstance(order_ids, list) or not order_ids or not all(isinstance(i, int) for i in order_ids):
+        return jsonify({"message": "order_ids must be a non-empty list of integers"}), 400
+    if len(order_ids) > MAX_RESTOCK_BATCH:
+        return jsonify({"message": f"At most {MAX_RESTOCK_BATCH} orders per request"}), 400
+    if status not in [s.value for s in RESTOCK_STATUSES]:
+        return jsonify({"message": "status must be Canceled or Returned"}), 400
+
+    restocked_ids, product_ids = restock_orders(order_ids, OrderStatus(status))
+    invalidate_product_details(*product_ids)
+
+    restocked = set(restocked_ids)
+    return jsonify({
+        "message": f"Restocked {len(restocked_ids)} orders",
+        "restocked": restocked_ids,
+        "skipped": sorted(set(order_ids) - restocked)
+    }), 200
+
+ORDER_PAGE_COLUMNS = [Order.created_at, Order.id]
+
 @order_bp.route("/list", methods=["GET"])
 @jwt_required()
 def get_orders():
     user_id = get_jwt_identity()["id"]
-    orders = Order.query.filter_by(user_id=user_id).all()
-
-    result = []
-    for order in orders:
-        result.append({
-            "id": order.id,
-            "total_price": order.total_price,
-            "status": order.status.value,
-            "created_at": order.created_at,
-            "items": [
-                {
-                    "product_id": item.product_id,
-                    "quantity": item.quantity,
-                    "discount_id": item.discount_id,
-                    "product_image": get_order_item_image(item.product_id),
-                    "product_name": Product.query.get(item.product_id).name,
-                    "price": item.price
-                } for item in order.order_items
-            ]
-        })
+    query = with_order_items(Order.query.filter_by(user_id=user_id))
+
+    if is_paginated_request():
+        limit, cursor, with_total = get_page_args()
+        try:
+            page = keyset_paginate(query, ORDER_PAGE_COLUMNS, limit, cursor, with_total=with_total)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        return jsonify(page_response(page, "orders", serialize_orders(page.items))), 200
+
+    result = serialize_orders(query.all())
     return jsonify(result), 200
 
 @order_bp.route("/admin/list", methods=["GET"])
@@ -135,25 +213,28 @@ def get_orders():
 @active_required()
 @role_required(UserRole.admin,UserRole.staff)
 def admin_get_orders():
-    orders = Order.query.all()
-
-    result = []
-    for order in orders:
-        result.append({
-            "id": order.id,
-            "total_price": order.total_price,
-            "status": order.status.value,
-            "created_at": order.created_at,
-            "items": [
-                {
-                    "product_id": item.product_id,
-                    "quantity": item.quantity,
-                    "discount_id": item.discount_id,
-                    "product_image": get_order_item_image(item.product_id),
-                    "product_name": Product.query.get(item.product_id).name,
-                    "price": item.price
-                } for item in order.order_items
-            ]
-        })
-    return jsonify(result), 200
+    filters, error = parse_order_filters(request.args)
+    if error:
+        return jsonify({"message": error}), 400
+
+    query = with_order_items(Order.query.filter(*order_filter_conditions(filters)))
+    if is_paginated_request():
+        limit, cursor, with_total = get_page_args()
+        try:
+            page = keyset_paginate(query, ORDER_PAGE_COLUMNS, limit, cursor, with_total=with_total)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        return jsonify(page_response(page, "orders", serialize_orders(page.items))), 200
 
+    def generate():
+        for orders in iter_batches(query, Order.id):
+            yield from serialize_orders(orders)
+
+    return stream_json_array(generate())
+
+@order_bp.route("/admin/export", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def admin_export_orders():
+    return export_response("orders")
@@ -1,11 +1,34 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from app.utils.security import role_required
-from app.services.product_service import get_product_with_details, set_default_image, save_product_image
+from app.utils.security import role_required, active_required
+from app.services.product_service import (
+    get_products_with_details,
+    set_default_image,
+    save_product_image,
+    product_changed,
+    parse_product_filters,
+    filter_products_query,
+    get_product_facets,
+    get_cached_product_payload,
+    invalidate_product_details,
+    product_detail_cache,
+    listing_flight,
+    product_images_changed,
+    PRODUCT_LISTING_VERSIONS,
+    iter_products_with_details,
+    bulk_update_products,
+    MAX_BULK_UPDATE,
+)
 from app.services.image_service import delete_image
+from app.services.category_service import get_category_tree, CATEGORY_VERSION
+from app.services.search_service import search_product_ids
+from app.services.import_service import import_products, detect_import_format
+from app.services.export_service import export_response
+from app.utils.etag import versioned_etag
+from app.utils.streaming import stream_json_array
+from app.utils.pagination import get_page_args, is_paginated_request, decode_cursor, keyset_paginate, page_response
 from app.extensions import db
-from app.utils.security import active_required
-from app.models import Category, Product, ProductImage, UserRole, Review
+from app.models import Product, ProductImage, UserRole, Review
 
 product_bp = Blueprint("product", __name__)
 
@@ -13,10 +36,10 @@ product_bp = Blueprint("product", __name__)
 # Lấy chi tiết sản phẩm kèm rating trung bình
 @product_bp.route("/product/<int:product_id>", methods=["GET"])
 def get_product(product_id):
-    product_data = get_product_with_details(product_id)
-    if not product_data:
+    payload = get_cached_product_payload(product_id)
+    if not payload:
         return jsonify({"message": "Product not found"}), 404
-    return jsonify(product_data), 200
+    return current_app.response_class(payload, mimetype="application/json"), 200
 
 # Thêm sản phẩm mới (Chỉ Admin)
 @product_bp.route("/add-product", methods=["POST"])
@@ -49,6 +72,7 @@ def add_product():
         category_id=category_id
     )
     db.session.add(new_product)
+    product_changed()
     db.session.commit()
 
     default_image_url = None
@@ -90,6 +114,32 @@ def add_product():
         "sub_image": sub_images_urls
     }), 201
 
+# Nhập sản phẩm hàng loạt từ file CSV/JSONL (Chỉ Admin)
+@product_bp.route("/bulk-import", methods=["POST"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def bulk_import_products():
+    if "file" not in request.files or not request.files["file"].filename:
+        return jsonify({"message": "No file part"}), 400
+
+    file = request.files["file"]
+    fmt = detect_import_format(file.filename, request.form.get("format") or request.args.get("format"))
+    if not fmt:
+        return jsonify({"message": "Unsupported file format, use csv or jsonl"}), 400
+
+    report = import_products(file.stream, fmt)
+    status = 201 if not report["failed"] else 207
+    return jsonify(report), status
+
+# Xuất danh sách sản phẩm kèm thống kê ra CSV/JSONL (Chỉ Admin)
+@product_bp.route("/export", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def export_products():
+    return export_response("products")
+
 # Thêm hình ảnh cho sản phẩm (Chỉ Admin)
 @product_bp.route("/upload-image/<int:product_id>", methods=["POST"])
 @jwt_required()
@@ -118,7 +168,9 @@ def upload_product_image(product_id):
                 if current_default_image:
                     current_default_image.is_default = False
                 new_default_image.is_default = True
+                product_images_changed()
                 db.session.commit()
+            invalidate_product_details(product_id)
             return jsonify({    
                 "message": "Images uploaded successfully",
                 "image_uploaded_url": image_url 
@@ -139,7 +191,9 @@ def delete_product_image_api(image_id):
         return jsonify({"message": "Cannot delete default image"}), 400
     delete_image(image.image_url)
     db.session.delete(image)
+    product_images_changed()
     db.session.commit()
+    invalidate_product_details(image.product_id)
 
     return jsonify({"message": "Image deleted successfully"}), 200
 
@@ -164,14 +218,39 @@ def update_product(product_id):
     product.brand = data.get("brand", product.brand)
     product.category_id = data.get("category_id", product.category_id)
 
+    product_changed()
     db.session.commit()
 
     if "default_image_url" in data:
         set_default_image(product.id, data["default_image_url"])
+    invalidate_product_details(product.id)
 
     return jsonify({"message": "Product updated successfully"}), 200
 
 
+# Cập nhật giá, tồn kho, giảm giá hàng loạt (Chỉ Admin)
+@product_bp.route("/bulk-update", methods=["PUT"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def bulk_update_products_api():
+    data = request.get_json()
+    entries = data.get("products") if isinstance(data, dict) else data
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"message": "products must be a non-empty list"}), 400
+    if len(entries) > MAX_BULK_UPDATE:
+        return jsonify({"message": f"At most {MAX_BULK_UPDATE} products per request"}), 400
+
+    results, updated = bulk_update_products(entries)
+    failed = len(results) - updated
+    return jsonify({
+        "updated": updated,
+        "failed": failed,
+        "results": results
+    }), 200 if not failed else 207
+
+
 # Xóa sản phẩm và hình ảnh (Chỉ Admin)
 @product_bp.route("/delete-product/<int:product_id>", methods=["DELETE"])
 @jwt_required()
@@ -191,7 +270,9 @@ def delete_product_api(product_id):
             db.session.delete(image)
 
     db.session.delete(product)
+    product_changed()
     db.session.commit() 
+    invalidate_product_details(product_id)
 
     return jsonify({"message": "Product deleted successfully"}), 200
 
@@ -199,31 +280,67 @@ def delete_product_api(product_id):
 
 # Lấy danh sách sản phẩm 
 @product_bp.route("/products", methods=["GET"])
+@versioned_etag(*PRODUCT_LISTING_VERSIONS, CATEGORY_VERSION)
 def get_products_by_category():
     category_id = request.args.get("category_id", type=int)
-    
-    if not category_id:
-        products = Product.query.all()
-        result = [get_product_with_details(prod.id) for prod in products]
-        return jsonify(result), 200
-
-    def get_subcategories(category):
-        subcategories = [sub.id for sub in category.subcategories]
-        for sub in category.subcategories:
-            subcategories.extend(get_subcategories(sub))
-        return subcategories
-
-    root_category = Category.query.get(category_id)
-    if not root_category:
-        return jsonify({"error": "Category not found"}), 404
-
-    category_ids = [root_category.id] + get_subcategories(root_category)
+    with_facets = request.args.get("facets", "false").lower() == "true"
+
+    category_ids = None
+    if category_id:
+        tree = get_category_tree()
+        if category_id not in tree.nodes:
+            return jsonify({"error": "Category not found"}), 404
+        category_ids = tree.subtree_ids(category_id)
+
+    filters = parse_product_filters(request.args)
+    query = filter_products_query(filters, category_ids)
+    paginated = is_paginated_request()
+
+    if not with_facets and not paginated:
+        return stream_json_array(iter_products_with_details(query))
+
+    limit, cursor, with_total = get_page_args()
+    try:
+        decode_cursor(cursor, [Product.id])
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    def build_listing():
+        if paginated:
+            page = keyset_paginate(query, [Product.id], limit, cursor, with_total=with_total)
+            result = page_response(page, "products", get_products_with_details(page.items))
+        else:
+            result = {"products": get_products_with_details(query.order_by(Product.id))}
+        if with_facets:
+            result["facets"] = get_product_facets(filters, category_ids)
+        return current_app.json.dumps(result)
+
+    # Các request giống hệt nhau đến cùng lúc chỉ chạy truy vấn một lần
+    key = tuple(sorted((name, tuple(values)) for name, values in request.args.lists()))
+    payload = listing_flight.do(key, build_listing)
+    return current_app.response_class(payload, mimetype="application/json"), 200
+
+
+# Tìm kiếm sản phẩm theo tên, mô tả, thương hiệu, chất liệu, xuất xứ
+@product_bp.route("/search", methods=["GET"])
+def search_products():
+    query = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    limit = request.args.get("limit", 10, type=int)
+
+    if not query:
+        return jsonify({"message": "Missing search query"}), 400
+    page = max(page, 1)
+    limit = min(max(limit, 1), 100)
+
+    product_ids, total = search_product_ids(query, limit, (page - 1) * limit)
 
-    products = Product.query.filter(Product.category_id.in_(category_ids)).all()
-
-    result = [get_product_with_details(product.id) for product in products]
-
-    return jsonify(result), 200
+    return jsonify({
+        "total": total,
+        "page": page,
+        "per_page": limit,
+        "products": get_products_with_details(product_ids)
+    }), 200
 
 
 #đặt hình ảnh sản phẩm mặc định
@@ -239,5 +356,16 @@ def set_default_image_product_api(image_id):
     if current_default_image:
         current_default_image.is_default = False
     new_default_image.is_default = True
+    product_images_changed()
     db.session.commit()
-    return jsonify({"message": "Set default image successfully"}), 200
\ No newline at end of file
+    invalidate_product_details(new_default_image.product_id)
+    return jsonify({"message": "Set default image successfully"}), 200
+
+
+# Thống kê cache chi tiết sản phẩm (Chỉ Admin)
+@product_bp.route("/cache-stats", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def get_product_cache_stats():
+    return jsonify(product_detail_cache.stats()), 200
\ No newline at end of file
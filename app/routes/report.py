@@ -0,0 +1,64 @@
+from flask import jsonify, Blueprint, request
+from flask_jwt_extended import jwt_required
+from app.models import UserRole
+from app.utils.security import role_required, active_required
+from app.services.report_service import (
+    parse_report_range, get_daily_sales, get_top_products, get_top_categories, get_discount_usage
+)
+
+report_bp = Blueprint("report", __name__)
+
+def _report_limit():
+    return min(max(request.args.get("limit", 10, type=int), 1), 100)
+
+# Doanh thu, số đơn và số sản phẩm bán ra theo từng ngày
+@report_bp.route("/revenue", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def revenue_report():
+    start, end, error = parse_report_range(request.args)
+    if error:
+        return jsonify({"message": error}), 400
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "days": get_daily_sales(start, end)}), 200
+
+# Sản phẩm bán chạy nhất theo số lượng
+@report_bp.route("/products", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def product_report():
+    start, end, error = parse_report_range(request.args)
+    if error:
+        return jsonify({"message": error}), 400
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "products": get_top_products(start, end, _report_limit())
+    }), 200
+
+# Danh mục có doanh thu cao nhất
+@report_bp.route("/categories", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def category_report():
+    start, end, error = parse_report_range(request.args)
+    if error:
+        return jsonify({"message": error}), 400
+    return jsonify({
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "categories": get_top_categories(start, end, _report_limit())
+    }), 200
+
+# Số lượt sử dụng mã giảm giá
+@report_bp.route("/discounts", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def discount_report():
+    start, end, error = parse_report_range(request.args)
+    if error:
+        return jsonify({"message": error}), 400
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "discounts": get_discount_usage(start, end)}), 200
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.security import role_required, active_required
+from app.utils.pagination import get_page_args, is_paginated_request, keyset_paginate, page_response
 from app.extensions import db
 from app.models import Order, OrderItem, OrderStatus, Review, Product, UserRole
+from app.services.stats_service import review_added, review_rating_changed, review_deleted
+from app.services.product_service import invalidate_product_details
+from app.services.export_service import export_response
 
 review_bp = Blueprint("review", __name__)
 
@@ -16,6 +20,9 @@ def has_purchased_product(user_id, product_id):
     ).first() is not None
 
 
+def is_valid_rating(rating):
+    return isinstance(rating, int) and not isinstance(rating, bool) and 1 <= rating <= 5
+
 # Lấy danh sách đánh giá của sản phẩm
 @review_bp.route("/product/<int:product_id>", methods=["GET"])
 def get_reviews(product_id):
@@ -23,7 +30,18 @@ def get_reviews(product_id):
     if not product:
         return jsonify({"message": "Product not found"}), 404
 
-    reviews = Review.query.filter_by(product_id=product_id).all()
+    query = Review.query.filter_by(product_id=product_id)
+    page = None
+    if is_paginated_request():
+        limit, cursor, with_total = get_page_args()
+        try:
+            page = keyset_paginate(query, [Review.id], limit, cursor, with_total=with_total)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        reviews = page.items
+    else:
+        reviews = query.all()
+
     result = [
         {
             "id": rev.id,
@@ -34,6 +52,8 @@ def get_reviews(product_id):
         }
         for rev in reviews
     ]
+    if page:
+        return jsonify(page_response(page, "reviews", result)), 200
     return jsonify(result), 200
 
 # Lấy danh sách đánh giá của người dùng
@@ -80,12 +100,14 @@ def add_review(product_id):
     rating = data.get("rating")
     comment = data.get("comment", "")
 
-    if not (1 <= rating <= 5):
+    if not is_valid_rating(rating):
         return jsonify({"message": "Rating must be between 1 and 5"}), 400
 
     new_review = Review(user_id=user_id, product_id=product_id, rating=rating, comment=comment)
     db.session.add(new_review)
+    review_added(new_review)
     db.session.commit()
+    invalidate_product_details(product_id)
 
     return jsonify({"message": "Review added successfully"}), 201
 
@@ -103,9 +125,15 @@ def update_review(review_id):
         return jsonify({"message": "Forbidden: You can only edit your own review"}), 403
 
     data = request.get_json()
+    if "rating" in data and not is_valid_rating(data["rating"]):
+        return jsonify({"message": "Rating must be between 1 and 5"}), 400
+
+    old_rating = review.rating
     review.rating = data.get("rating", review.rating)
     review.comment = data.get("comment", review.comment)
+    review_rating_changed(review, old_rating)
     db.session.commit()
+    invalidate_product_details(review.product_id)
 
     return jsonify({"message": "Review updated successfully"}), 200
 
@@ -123,8 +151,11 @@ def delete_review(review_id):
     if review.user_id != identity["id"] and identity["role"] != UserRole.admin.value:
         return jsonify({"message": "Forbidden: You can only delete your own review or be an Admin"}), 403
 
+    product_id = review.product_id
+    review_deleted(review)
     db.session.delete(review)
     db.session.commit()
+    invalidate_product_details(product_id)
 
     return jsonify({"message": "Review deleted successfully"}), 200
 
@@ -136,8 +167,7 @@ def delete_review(review_id):
 def get_all_reviews():
     product_id = request.args.get("product_id", type=int)
     user_id = request.args.get("user_id", type=int)
-    page = request.args.get("page", 1, type=int)
-    limit = request.args.get("limit", 10, type=int)
+    limit, cursor, with_total = get_page_args()
 
     query = Review.query
 
@@ -146,7 +176,10 @@ def get_all_reviews():
     if user_id:
         query = query.filter_by(user_id=user_id)
 
-    reviews = query.paginate(page=page, per_page=limit, error_out=False)
+    try:
+        reviews = keyset_paginate(query, [Review.id], limit, cursor, with_total=with_total)
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
 
     result = [
         {
@@ -162,9 +195,13 @@ def get_all_reviews():
         for rev in reviews.items
     ]
 
-    return jsonify({
-        "total": reviews.total,
-        "page": reviews.page,
-        "per_page": reviews.per_page,
-        "reviews": result
-    }), 200
\ No newline at end of file
+    return jsonify(page_response(reviews, "reviews", result)), 200
+
+
+# Xuất toàn bộ đánh giá ra CSV/JSONL (Chỉ Admin)
+@review_bp.route("/export", methods=["GET"])
+@jwt_required()
+@active_required()
+@role_required(UserRole.admin, UserRole.staff)
+def export_reviews():
+    return export_response("reviews")
@@ -5,6 +5,7 @@ from app.services.image_service import save_image, delete_image
 from app.extensions import db
 from app.models import Address, Gender, User, UserRole
 from app.utils.security import role_required, active_required
+from app.utils.pagination import get_page_args, keyset_paginate, page_response
 
 user_bp = Blueprint("user", __name__)
 
@@ -281,14 +282,16 @@ def set_default_address(address_id):
 @role_required(UserRole.admin, UserRole.staff)
 def get_users():
     role = request.args.get("role", "").strip().lower()
-    page = request.args.get("page", 1, type=int)
-    limit = request.args.get("limit", 10, type=int)
+    limit, cursor, with_total = get_page_args()
 
     query = User.query
     if role and role in UserRole.__members__:
         query = query.filter_by(role=UserRole[role])
 
-    users = query.paginate(page=page, per_page=limit, error_out=False)
+    try:
+        users = keyset_paginate(query, [User.id], limit, cursor, with_total=with_total)
+    except ValueError:
+        return jsonify({"message": "Invalid cursor"}), 400
 
     result = [
         {
@@ -303,12 +306,7 @@ def get_users():
         for user in users.items
     ]
 
-    return jsonify({
-        "total": users.total,
-        "page": users.page,
-        "per_page": users.per_page,
-        "users": result
-    }), 200
+    return jsonify(page_response(users, "users", result)), 200
 
 @user_bp.route('/delete/<int:user_id>', methods=['DELETE'])
 @jwt_required()
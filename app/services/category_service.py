@@ -0,0 +1,151 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from sqlalchemy import select, literal
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models import Category, CategoryClosure
+from app.services.version_service import get_version, bump_version
+
+CATEGORY_VERSION = "category"
+
+# Bảng closure lưu mọi cặp (tổ tiên, hậu duệ) kèm độ sâu, mỗi danh mục có một dòng tự trỏ depth = 0.
+# Các hàm dưới đây không commit, thay đổi đi cùng transaction của thao tác trên Category.
+
+def get_subtree_ids(category_id):
+    return [
+        descendant_id for (descendant_id,) in db.session.query(CategoryClosure.descendant_id)
+        .filter(CategoryClosure.ancestor_id == category_id)
+        .all()
+    ]
+
+def is_descendant(category_id, ancestor_id):
+    return db.session.query(CategoryClosure.depth).filter_by(
+        ancestor_id=ancestor_id, descendant_id=category_id
+    ).first() is not None
+
+def insert_category_closure(category):
+    db.session.add(CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0))
+    if category.parent_id:
+        db.session.execute(
+            CategoryClosure.__table__.insert().from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    CategoryClosure.ancestor_id,
+                    literal(category.id),
+                    CategoryClosure.depth + 1
+                ).where(CategoryClosure.descendant_id == category.parent_id)
+            )
+        )
+
+def _detach_subtree(subtree_ids):
+    CategoryClosure.query.filter(
+        CategoryClosure.descendant_id.in_(subtree_ids),
+        CategoryClosure.ancestor_id.notin_(subtree_ids)
+    ).delete(synchronize_session=False)
+
+# Chuyển cả cây con của danh mục sang cha mới, trả về lỗi nếu tạo thành vòng lặp
+def move_category(category, new_parent_id):
+    if new_parent_id == category.id or (new_parent_id and is_descendant(new_parent_id, category.id)):
+        return "Category cannot be moved under itself or its subcategories"
+
+    db.session.flush()
+    _detach_subtree(get_subtree_ids(category.id))
+
+    if new_parent_id:
+        supertree = aliased(CategoryClosure)
+        subtree = aliased(CategoryClosure)
+        db.session.execute(
+            CategoryClosure.__table__.insert().from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    supertree.ancestor_id,
+                    subtree.descendant_id,
+                    supertree.depth + subtree.depth + 1
+                ).select_from(supertree).join(
+                    subtree, subtree.ancestor_id == category.id
+                ).where(supertree.descendant_id == new_parent_id)
+            )
+        )
+
+    category.parent_id = new_parent_id
+    return None
+
+# Xóa danh mục khỏi closure, các danh mục con trực tiếp trở thành danh mục gốc
+def delete_category_closure(category):
+    children_subtree = [cid for cid in get_subtree_ids(category.id) if cid != category.id]
+    if children_subtree:
+        _detach_subtree(children_subtree)
+    Category.query.filter_by(parent_id=category.id).update({Category.parent_id: None}, synchronize_session=False)
+    CategoryClosure.query.filter(
+        (CategoryClosure.ancestor_id == category.id) | (CategoryClosure.descendant_id == category.id)
+    ).delete(synchronize_session=False)
+
+CategoryNode = namedtuple("CategoryNode", ["id", "name", "parent_id"])
+
+# Ảnh chụp bất biến của cả cây danh mục tại một version
+class CategoryTree:
+    def __init__(self, version, nodes, children, descendants):
+        self.version = version
+        self.nodes = MappingProxyType(nodes)
+        self.children = MappingProxyType({k: tuple(v) for k, v in children.items()})
+        self.descendants = MappingProxyType({k: frozenset(v) for k, v in descendants.items()})
+
+    def children_of(self, parent_id):
+        return [self.nodes[cid] for cid in self.children.get(parent_id, ())]
+
+    def subtree_ids(self, category_id):
+        return self.descendants.get(category_id, frozenset())
+
+_tree = None
+_tree_lock = threading.Lock()
+
+def load_category_tree(version):
+    nodes, children = {}, {}
+    for category in Category.query.order_by(Category.id).all():
+        nodes[category.id] = CategoryNode(category.id, category.name, category.parent_id)
+        children.setdefault(category.parent_id, []).append(category.id)
+
+    descendants = {category_id: {category_id} for category_id in nodes}
+    for ancestor_id, descendant_id in db.session.query(CategoryClosure.ancestor_id, CategoryClosure.descendant_id).all():
+        if ancestor_id in descendants:
+            descendants[ancestor_id].add(descendant_id)
+    return CategoryTree(version, nodes, children, descendants)
+
+# Trả về cây danh mục trong bộ nhớ, chỉ nạp lại khi version trong DB đã thay đổi
+def get_category_tree():
+    global _tree
+    version = get_version(CATEGORY_VERSION)
+    tree = _tree
+    if tree is None or tree.version != version:
+        with _tree_lock:
+            if _tree is None or _tree.version != version:
+                _tree = load_category_tree(version)
+            tree = _tree
+    return tree
+
+def category_changed():
+    bump_version(CATEGORY_VERSION)
+
+# Dựng lại toàn bộ closure từ cột parent_id
+def rebuild_category_closure():
+    parents = dict(db.session.query(Category.id, Category.parent_id).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": category_id, "depth": depth})
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    CategoryClosure.query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(CategoryClosure.__table__.insert(), rows)
+    category_changed()
+    db.session.commit()
+    return len(parents)
+
+def ensure_category_closure():
+    if CategoryClosure.query.first() is None and Category.query.first() is not None:
+        rebuild_category_closure()
@@ -0,0 +1,160 @@
+import threading
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+from sqlalchemy import and_, or_, case
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.utils.idempotency import commit_or_defer
+from app.models import Discount, UserDiscount
+from app.services.version_service import bump_version, bump_version_after_commit, get_version
+
+DISCOUNT_VERSION = "discount"
+# Chỉ tăng khi quy tắc của mã thay đổi (tạo/xóa), không tăng khi có người thu thập
+DISCOUNT_RULES_VERSION = "discount_rules"
+
+def discount_rules_changed():
+    bump_version(DISCOUNT_VERSION)
+    bump_version(DISCOUNT_RULES_VERSION)
+
+ActiveDiscount = namedtuple("ActiveDiscount", [
+    "id", "code", "discount_percent", "release_date", "expiration_date", "minimum_order_value"
+])
+
+# Ảnh chụp bất biến các mã chưa hết hạn (kể cả mã chưa tới ngày phát hành), tra theo id hoặc code.
+# next_expiry là thời điểm hết hạn sớm nhất, khi vượt qua thì loại các mã đã hết hạn mà không cần đọc DB.
+class ActiveDiscountIndex:
+    def __init__(self, version, discounts):
+        self.version = version
+        self.by_id = MappingProxyType({d.id: d for d in discounts})
+        self.by_code = MappingProxyType({d.code: d for d in discounts})
+        self.next_expiry = min((d.expiration_date for d in discounts), default=None)
+
+    def without_expired(self, now):
+        return ActiveDiscountIndex(self.version, [d for d in self.by_id.values() if d.expiration_date >= now])
+
+    def get(self, discount_id):
+        return self.by_id.get(discount_id)
+
+    def get_by_code(self, code):
+        return self.by_code.get(code)
+
+_discount_index = None
+_discount_index_lock = threading.Lock()
+
+def load_active_discount_index(version, now=None):
+    now = now or datetime.utcnow()
+    rows = (
+        db.session.query(*[getattr(Discount, field) for field in ActiveDiscount._fields])
+        .filter(Discount.expiration_date >= now)
+        .all()
+    )
+    return ActiveDiscountIndex(version, [ActiveDiscount(*row) for row in rows])
+
+# Trả về index các mã còn hạn của process, nạp lại khi DISCOUNT_RULES_VERSION thay đổi
+def get_active_discount_index():
+    global _discount_index
+    now = datetime.utcnow()
+    version = get_version(DISCOUNT_RULES_VERSION)
+    index = _discount_index
+    if index is None or index.version != version or (index.next_expiry and index.next_expiry < now):
+        with _discount_index_lock:
+            if _discount_index is None or _discount_index.version != version:
+                _discount_index = load_active_discount_index(version, now)
+            elif _discount_index.next_expiry and _discount_index.next_expiry < now:
+                _discount_index = _discount_index.without_expired(now)
+            index = _discount_index
+    return index
+
+# Một truy vấn lấy các mã user đã thu thập và chưa dùng trong số discount_ids
+def get_unused_user_discount_ids(user_id, discount_ids):
+    discount_ids = set(discount_ids)
+    if not discount_ids:
+        return set()
+    return {
+        discount_id for (discount_id,) in db.session.query(UserDiscount.discount_id).filter(
+            UserDiscount.user_id == user_id,
+            UserDiscount.discount_id.in_(discount_ids),
+            UserDiscount.is_used.is_(False)
+        ).all()
+    }
+
+# Đánh dấu đã dùng bằng một UPDATE có điều kiện is_used = False; trả về False nếu có mã
+# vừa bị một đơn khác dùng mất (caller phải rollback)
+def mark_user_discounts_used(user_id, discount_ids):
+    discount_ids = set(discount_ids)
+    if not discount_ids:
+        return True
+    updated = UserDiscount.query.filter(
+        UserDiscount.user_id == user_id,
+        UserDiscount.discount_id.in_(discount_ids),
+        UserDiscount.is_used.is_(False)
+    ).update({"is_used": True}, synchronize_session=False)
+    return updated == len(discount_ids)
+
+# Điều kiện SQL của mã còn hiệu lực: đang trong thời gian áp dụng và chưa đủ max_users
+def discount_valid_conditions(now=None):
+    now = now or datetime.utcnow()
+    return [
+        Discount.release_date <= now,
+        Discount.expiration_date >= now,
+        or_(Discount.max_users.is_(None), Discount.collected_count < Discount.max_users)
+    ]
+
+# Truy vấn danh sách mã giảm giá, is_valid tính trong SQL từ collected_count, không nạp UserDiscount
+def discount_listing_query(available_only=False):
+    now = datetime.utcnow()
+    query = db.session.query(
+        Discount.id,
+        Discount.code,
+        Discount.discount_percent,
+        Discount.release_date,
+        Discount.expiration_date,
+        Discount.max_users,
+        Discount.minimum_order_value,
+        Discount.collected_count,
+        case((and_(*discount_valid_conditions(now)), True), else_=False).label("is_valid")
+    )
+    if available_only:
+        query = query.filter(Discount.release_date <= now, Discount.expiration_date >= now)
+    return query
+
+def serialize_discount_row(row):
+    return {
+        "id": row.id,
+        "code": row.code,
+        "discount_percent": row.discount_percent,
+        "release_date": row.release_date,
+        "expiration_date": row.expiration_date,
+        "max_users": row.max_users,
+        "minimum_order_value": row.minimum_order_value,
+        "collected_users": row.collected_count,
+        "is_valid": bool(row.is_valid)
+    }
+
+# Thu thập mã giảm giá: tăng collected_count bằng UPDATE có điều kiện (còn hạn và chưa đủ max_users)
+# nên các request đồng thời không vượt max_users; ràng buộc unique (user_id, discount_id) chặn thu thập trùng.
+def collect_user_discount(user_id, discount_id):
+    if UserDiscount.query.filter_by(user_id=user_id, discount_id=discount_id).first():
+        return None, "You have already collected this discount"
+
+    claimed = Discount.query.filter(
+        Discount.id == discount_id,
+        *discount_valid_conditions()
+    ).update({Discount.collected_count: Discount.collected_count + 1}, synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        return None, "Discount is no longer available"
+
+    user_discount = UserDiscount(user_id=user_id, discount_id=discount_id)
+    db.session.add(user_discount)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return None, "You have already collected this discount"
+
+    commit_or_defer()
+    # Bộ đếm chỉ phục vụ ETag danh sách mã: tăng sau commit để các lượt thu thập không cùng khóa một dòng
+    bump_version_after_commit(DISCOUNT_VERSION)
+    return user_discount, None
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+from datetime import datetime
+from flask import request, current_app, jsonify, stream_with_context
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Product, Order, Review
+from app.utils.streaming import iter_batches
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+PRODUCT_COLUMNS = [
+    "id", "name", "description", "price", "stock", "material", "origin", "brand",
+    "discount", "category_id", "avg_rating", "review_count", "sold"
+]
+ORDER_COLUMNS = [
+    "id", "user_id", "status", "total_price", "created_at",
+    "item_id", "product_id", "quantity", "price", "discount_id"
+]
+REVIEW_COLUMNS = ["id", "user_id", "product_id", "rating", "comment", "created_at"]
+
+# since là số (lấy id lớn hơn) hoặc ngày giờ ISO (lấy created_at lớn hơn hoặc bằng)
+def parse_since(value):
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    return datetime.fromisoformat(value)
+
+def _since_filter(query, model, since):
+    if since is None:
+        return query
+    if isinstance(since, datetime):
+        if not hasattr(model, "created_at"):
+            raise ValueError("This export only supports an id for since")
+        return query.filter(model.created_at >= since)
+    return query.filter(model.id > since)
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def iter_product_records(since=None, nested=False):
+    query = _since_filter(Product.query.options(joinedload(Product.stats)), Product, since)
+    for products in iter_batches(query, Product.id):
+        for product in products:
+            stats = product.stats
+            review_count = stats.review_count if stats else 0
+            yield {
+                "id": product.id,
+                "name": product.name,
+                "description": product.description,
+                "price": product.price,
+                "stock": product.stock,
+                "material": product.material,
+                "origin": product.origin,
+                "brand": product.brand,
+                "discount": product.discount,
+                "category_id": product.category_id,
+                "avg_rating": round(stats.avg_rating, 2) if stats else 0,
+                "review_count": review_count,
+                "sold": stats.sold_quantity if stats else 0,
+            }
+
+# nested=True: mỗi đơn một bản ghi kèm danh sách items (JSONL); ngược lại mỗi item một dòng (CSV)
+def iter_order_records(since=None, nested=False):
+    query = _since_filter(Order.query.options(selectinload(Order.order_items)), Order, since)
+    for orders in iter_batches(query, Order.id):
+        for order in orders:
+            record = {
+                "id": order.id,
+                "user_id": order.user_id,
+                "status": order.status.value,
+                "total_price": order.total_price,
+                "created_at": _iso(order.created_at),
+            }
+            items = [
+                {
+                    "item_id": item.id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "price": item.price,
+                    "discount_id": item.discount_id,
+                }
+                for item in order.order_items
+            ]
+            if nested:
+                yield dict(record, items=items)
+            else:
+                for item in items or [{}]:
+                    yield dict(record, **item)
+
+def iter_review_records(since=None, nested=False):
+    query = _since_filter(Review.query, Review, since)
+    for reviews in iter_batches(query, Review.id):
+        for review in reviews:
+            yield {
+                "id": review.id,
+                "user_id": review.user_id,
+                "product_id": review.product_id,
+                "rating": review.rating,
+                "comment": review.comment,
+                "created_at": _iso(review.created_at),
+            }
+
+EXPORTS = {
+    "products": (Product, iter_product_records, PRODUCT_COLUMNS),
+    "orders": (Order, iter_order_records, ORDER_COLUMNS),
+    "reviews": (Review, iter_review_records, REVIEW_COLUMNS),
+}
+
+def validate_since(name, since):
+    model = EXPORTS[name][0]
+    _since_filter(model.query, model, since)
+
+# Sinh nội dung file xuất theo từng dòng, bộ nhớ không phụ thuộc số bản ghi
+def generate_export(name, fmt, since=None):
+    _, iter_records, columns = EXPORTS[name]
+    records = iter_records(since, nested=fmt == "jsonl")
+
+    if fmt == "jsonl":
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+# Response tải file xuất, đọc format và since từ query string
+def export_response(name):
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": "Unsupported format, use csv or jsonl"}), 400
+    try:
+        since = parse_since(request.args.get("since"))
+        validate_since(name, since)
+    except ValueError:
+        return jsonify({"message": "Invalid since, use an id or an ISO date"}), 400
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = current_app.response_class(stream_with_context(generate_export(name, fmt, since)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={name}.{fmt}"
+    return response
@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+import math
+from sqlalchemy import insert
+from app.extensions import db
+from app.models import Category, Product
+from app.services.product_service import product_changed
+
+IMPORT_FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 1000
+
+def detect_import_format(filename, requested=None):
+    fmt = (requested or (filename or "").rsplit(".", 1)[-1]).lower()
+    if fmt in ("ndjson", "json"):
+        fmt = "jsonl"
+    return fmt if fmt in IMPORT_FORMATS else None
+
+# Đọc lần lượt từng dòng của file nhị phân, trả về (số dòng, dict dữ liệu hoặc None, lỗi)
+def iter_import_rows(binary_stream, fmt):
+    text_stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_no, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+        yield line_no, row, None
+
+def _optional_text(row, key):
+    value = row.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+# Đọc một số hữu hạn; integer=True thì chỉ nhận số nguyên ("3", 3, 3.0) và báo lỗi với 3.5 thay vì cắt bớt
+def _number(row, key, integer=False, default=None):
+    value = row.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    if isinstance(value, bool):
+        raise ValueError(key)
+    if integer and isinstance(value, int):
+        return value
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(key)
+    if integer:
+        if not number.is_integer():
+            raise ValueError(key)
+        return int(number)
+    return number
+
+def validate_import_row(row, category_ids):
+    name = _optional_text(row, "name")
+    if not name:
+        return None, "Missing name"
+    try:
+        price = _number(row, "price")
+    except (TypeError, ValueError):
+        return None, "price must be a finite number"
+    integers = {}
+    for key, default in (("stock", 0), ("discount", 0), ("category_id", None)):
+        try:
+            integers[key] = _number(row, key, True, default)
+        except (TypeError, ValueError):
+            return None, f"{key} must be an integer"
+    stock, discount, category_id = integers["stock"], integers["discount"], integers["category_id"]
+
+    if price is None or price < 0:
+        return None, "Missing or negative price"
+    if stock < 0:
+        return None, "Stock cannot be negative"
+    if not 0 <= discount <= 100:
+        return None, "Discount must be between 0 and 100"
+    if category_id not in category_ids:
+        return None, f"Category {category_id} does not exist"
+
+    return {
+        "name": name[:255],
+        "description": _optional_text(row, "description"),
+        "price": price,
+        "stock": stock,
+        "material": _optional_text(row, "material"),
+        "origin": _optional_text(row, "origin"),
+        "brand": _optional_text(row, "brand"),
+        "discount": discount,
+        "category_id": category_id,
+    }, None
+
+# Nhập sản phẩm hàng loạt: mỗi lô batch_size dòng hợp lệ được chèn bằng một executemany và commit riêng,
+# nên bộ nhớ chỉ phụ thuộc kích thước lô chứ không phụ thuộc kích thước file
+def import_products(binary_stream, fmt, batch_size=1000):
+    category_ids = {category_id for (category_id,) in db.session.query(Category.id).all()}
+    report = {"inserted": 0, "failed": 0, "errors": []}
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        db.session.execute(insert(Product), batch)
+        product_changed()
+        db.session.commit()
+        report["inserted"] += len(batch)
+        batch.clear()
+
+    for line_no, row, error in iter_import_rows(binary_stream, fmt):
+        values = None
+        if error is None:
+            values, error = validate_import_row(row, category_ids)
+        if error:
+            report["failed"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": line_no, "error": error})
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    return report
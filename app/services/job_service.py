@@ -0,0 +1,138 @@
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models import Job, JobStatus
+
+JOB_HANDLERS = {}
+
+# Đăng ký hàm xử lý cho một loại job; hàm nhận payload (dict) và chạy trong app context
+def job_handler(name):
+    def decorator(fn):
+        JOB_HANDLERS[name] = fn
+        return fn
+    return decorator
+
+# Thêm job vào hàng đợi trong transaction hiện tại, không commit:
+# job chỉ xuất hiện khi thao tác ghi đi kèm (vd tạo đơn) được commit
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        status=JobStatus.pending,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts or current_app.config["JOB_MAX_ATTEMPTS"]
+    )
+    db.session.add(job)
+    return job
+
+# Đưa các job running bị treo quá JOB_LOCK_TIMEOUT (worker chết giữa chừng) về pending
+def requeue_stale_jobs():
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config["JOB_LOCK_TIMEOUT"])
+    count = Job.query.filter(Job.status == JobStatus.running, Job.locked_at < cutoff).update(
+        {"status": JobStatus.pending, "locked_at": None}, synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+# Nhận tối đa limit job đến hạn. Mỗi job được nhận bằng UPDATE có điều kiện status = pending,
+# nên nhiều worker chạy song song không nhận trùng một job.
+def claim_jobs(limit):
+    now = datetime.utcnow()
+    candidates = [
+        job_id for (job_id,) in db.session.query(Job.id)
+        .filter(Job.status == JobStatus.pending, Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+        .all()
+    ]
+    claimed = []
+    for job_id in candidates:
+        updated = Job.query.filter(Job.id == job_id, Job.status == JobStatus.pending).update(
+            {"status": JobStatus.running, "locked_at": now}, synchronize_session=False
+        )
+        if updated:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+def _backoff(attempts):
+    base = current_app.config["JOB_BACKOFF_BASE"]
+    return min(base * 2 ** (attempts - 1), current_app.config["JOB_BACKOFF_MAX"])
+
+# Chạy một job đã nhận; lỗi thì thử lại sau thời gian chờ tăng dần, hết lượt thì đánh dấu failed
+def run_job(job_id):
+    job = Job.query.get(job_id)
+    if not job or job.status != JobStatus.running:
+        return None
+
+    handler = JOB_HANDLERS.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name}")
+        handler(json.loads(job.payload))
+    except Exception:
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        job.attempts += 1
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.failed
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = JobStatus.pending
+            job.run_at = datetime.utcnow() + timedelta(seconds=_backoff(job.attempts))
+        db.session.commit()
+        current_app.logger.warning("Job %s (%s) failed, attempt %s", job.id, job.name, job.attempts)
+        return job.status
+
+    job.attempts += 1
+    job.status = JobStatus.done
+    job.locked_at = None
+    job.last_error = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job.status
+
+def _run_in_context(app, job_id):
+    with app.app_context():
+        try:
+            return run_job(job_id)
+        finally:
+            db.session.remove()
+
+# Vòng lặp worker: nhận job đến hạn và chạy trên thread pool gồm concurrency luồng.
+# once=True thì dừng khi không còn job đến hạn (dùng cho cron hoặc kiểm tra).
+def run_worker(app, concurrency=4, poll_interval=1.0, once=False):
+    processed = 0
+    running = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            running = {future for future in running if not future.done()}
+            free = concurrency - len(running)
+            claimed = []
+            if free > 0:
+                with app.app_context():
+                    requeue_stale_jobs()
+                    claimed = claim_jobs(free)
+                    db.session.remove()
+            for job_id in claimed:
+                running.add(pool.submit(_run_in_context, app, job_id))
+            processed += len(claimed)
+
+            if not claimed:
+                if once and not running:
+                    return processed
+                time.sleep(poll_interval)
+
+# Xóa các job đã xong (và đã thất bại nếu include_failed) cũ hơn days ngày
+def prune_jobs(days=7, include_failed=False):
+    statuses = [JobStatus.done, JobStatus.failed] if include_failed else [JobStatus.done]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = Job.query.filter(Job.status.in_(statuses), Job.finished_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return count
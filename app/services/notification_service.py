@@ -0,0 +1,63 @@
+from flask import current_app
+from app.models import Order, Product, User, UserRole
+from app.services.auth_service import send_notification
+from app.services.job_service import enqueue, job_handler
+
+ORDER_CONFIRMATION_JOB = "send_order_confirmation"
+ORDER_STATUS_JOB = "send_order_status_update"
+LOW_STOCK_JOB = "check_low_stock"
+
+# Xếp hàng email xác nhận và kiểm tra tồn kho thấp cho đơn vừa tạo (trong cùng transaction)
+def order_placed(order, product_ids):
+    enqueue(ORDER_CONFIRMATION_JOB, {"order_id": order.id})
+    enqueue(LOW_STOCK_JOB, {"product_ids": sorted(product_ids)})
+
+def order_status_updated(order):
+    enqueue(ORDER_STATUS_JOB, {"order_id": order.id, "status": order.status.value})
+
+@job_handler(ORDER_CONFIRMATION_JOB)
+def send_order_confirmation(payload):
+    order = Order.query.get(payload["order_id"])
+    if not order or not order.user:
+        return
+    lines = [f"- {item.product.name} x {item.quantity}: {item.price}" for item in order.order_items]
+    body = "\n".join([
+        f"Thank you for your order #{order.id}.",
+        "",
+        *lines,
+        "",
+        f"Total: {order.total_price}"
+    ])
+    send_notification(order.user.email, f"Order #{order.id} confirmation", body)
+
+@job_handler(ORDER_STATUS_JOB)
+def send_order_status_update(payload):
+    order = Order.query.get(payload["order_id"])
+    if not order or not order.user:
+        return
+    send_notification(
+        order.user.email,
+        f"Order #{order.id} is now {payload['status']}",
+        f"The status of your order #{order.id} has been updated to {payload['status']}."
+    )
+
+# Gửi cảnh báo cho admin khi tồn kho của sản phẩm xuống dưới LOW_STOCK_THRESHOLD
+@job_handler(LOW_STOCK_JOB)
+def check_low_stock(payload):
+    threshold = current_app.config["LOW_STOCK_THRESHOLD"]
+    products = (
+        Product.query
+        .filter(Product.id.in_(payload["product_ids"]), Product.stock < threshold)
+        .order_by(Product.id)
+        .all()
+    )
+    if not products:
+        return
+    recipients = [
+        email for (email,) in User.query.with_entities(User.email)
+        .filter(User.role == UserRole.admin, User.is_active.is_(True))
+        .all()
+    ]
+    body = "\n".join(f"- #{p.id} {p.name}: {p.stock} left" for p in products)
+    for email in recipients:
+        send_notification(email, "Low stock alert", f"These products are running low:\n{body}")
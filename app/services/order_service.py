@@ -1,83 +1,85 @@
-from app.models import Discount, UserDiscount, Product, CartItem, ProductImage
-from datetime import datetime
+from app.models import UserDiscount, Product, CartItem, ProductImage, Order, OrderItem, OrderStatus
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update, exists, select, func
+from sqlalchemy.orm import selectinload
 from app.extensions import db
-def apply_discount(user_id, discount_id, price):
+from app.utils.idempotency import commit_or_defer
+from app.services.product_service import product_stock_changed, PRODUCT_STOCK_VERSION
+from app.services.version_service import bump_version_after_commit
+from app.services.discount_service import get_active_discount_index, get_unused_user_discount_ids, mark_user_discounts_used
+from app.services.notification_service import order_placed, order_status_updated
+from app.services.stats_service import order_status_changed
+from app.services.reservation_service import reserved_quantity_subquery, release_user_reservations
 
-    discount = Discount.query.filter_by(id=discount_id).first()
-    
-    if not discount:
-        return None, "Invalid discount code"
-    
-    if discount.expiration_date < datetime.utcnow():
-        return None, "Discount code has expired"
-
-    if discount.release_date > datetime.utcnow():
-        return None, "Discount code is not active yet"
-    
-    if discount.minimum_order_value and price < discount.minimum_order_value:
-        return None, f"Minimum order value to use this discount is {discount.minimum_order_value}"
-
-    user_discount = UserDiscount.query.filter_by(user_id=user_id, discount_id=discount.id, is_used=False).first()
-    if not user_discount:
-        return None, "You haven't collected or already used this discount"
-    user_discount.is_used = True
-    db.session.commit()
-
-    discount_amount = price * (discount.discount_percent / 100)
-    return discount_amount, None
-
-
-def validate_item_discount(discount_id, user_id, product_price, quantity):
+# Kiểm tra mã của một dòng đơn với index các mã còn hạn; available là tập mã user đã thu thập
+# và chưa dùng, mã hợp lệ được bỏ khỏi tập để không dùng hai lần trong cùng đơn
+def validate_item_discount(discount_id, index, available, product_price, quantity, now=None):
     if not discount_id:
         return None, None
 
-    discount = Discount.query.get(discount_id)
-    current_time = datetime.utcnow()
+    discount = index.get(discount_id)
+    current_time = now or datetime.utcnow()
 
     if not discount:
         return None, "Discount not found"
     if discount.release_date > current_time or discount.expiration_date < current_time:
         return None, "Discount is not active"
-    user_discount = UserDiscount.query.filter_by(user_id=user_id, discount_id=discount.id, is_used=False).first()
-    if not user_discount:
+    if discount.id not in available:
         return None, "User has not collected this discount or it has already been used"
-    if product_price * quantity < discount.minimum_order_value:
+    if discount.minimum_order_value and product_price * quantity < discount.minimum_order_value:
         return None, "Order item does not meet minimum value for discount"
 
-    user_discount.is_used = True
-    db.session.commit()
+    available.discard(discount.id)
     return discount, None
 
 
-def calculate_order_items_total(order_items_data, user_id):
+# Tính giá từng dòng và tổng đơn; products là dict id -> Product đã nạp sẵn.
+# Kiểm tra tồn kho ở đây chỉ để báo lỗi sớm, việc trừ kho thật sự dùng UPDATE có điều kiện trong place_order.
+# Mã giảm giá được kiểm tra với index trong bộ nhớ; UserDiscount chỉ đọc một lần cho cả đơn
+# và được đánh dấu đã dùng bằng một UPDATE duy nhất (không commit).
+def calculate_order_items_total(order_items_data, user_id, products=None):
     order_items = []
     total_price = 0
 
+    if products is None:
+        products = load_order_products(order_items_data)
+
+    discount_ids = {
+        item.get("discount_id") for item in order_items_data
+        if isinstance(item, dict) and isinstance(item.get("discount_id"), int)
+    }
+    index = get_active_discount_index() if discount_ids else None
+    available = get_unused_user_discount_ids(user_id, discount_ids)
+    now = datetime.utcnow()
 
     for item_data in order_items_data:
         product_id = item_data.get("product_id")
         quantity = item_data.get("quantity", 1)
         discount_id = item_data.get("discount_id")
 
-        if not product_id or quantity <= 0:
+        if not product_id or not isinstance(quantity, int) or quantity <= 0:
             return None, None, f"Invalid product_id or quantity in item: {item_data}"
 
-        product = Product.query.get(product_id)
+        product = products.get(product_id)
         if not product:
             return None, None, f"Product with id {product_id} not found"
         
         if quantity > product.stock:
             return None, None, f"Not enough stock for product {product_id}. Available: {product.stock}, Requested: {quantity}"
 
+        # OrderItem.price luôn là thành tiền của cả dòng: đơn giá sau giảm giá sản phẩm nhân số lượng,
+        # nhân thêm hệ số của mã giảm giá nếu có
         original_price = product.price * (1 - product.discount / 100)
-        final_price = original_price
+        final_price = original_price * quantity
 
         discount = None
         if discount_id:
-            discount, error = validate_item_discount(discount_id, user_id, original_price, quantity)
+            if not isinstance(discount_id, int):
+                return None, None, f"Discount error for product {product_id}: Discount not found"
+            discount, error = validate_item_discount(discount_id, index, available, original_price, quantity, now)
             if error:
                 return None, None, f"Discount error for product {product_id}: {error}"
-            final_price = (original_price * quantity) * (1 - discount.discount_percent / 100)
+            final_price = final_price * (1 - discount.discount_percent / 100)
 
         total_price += final_price
 
@@ -88,10 +90,249 @@ def calculate_order_items_total(order_items_data, user_id):
             "discount_id": discount.id if discount else None
         })
 
+    used_ids = [item["discount_id"] for item in order_items if item["discount_id"]]
+    if not mark_user_discounts_used(user_id, used_ids):
+        return None, None, "A discount in this order has already been used"
+
     return order_items, total_price, None
 
-def get_order_item_image(product_id):
-    image = ProductImage.query.filter_by(product_id= product_id,is_default=True).first()
-    if not image:
-        return None
-    return image.image_url
+def load_order_products(order_items_data):
+    product_ids = {
+        item.get("product_id") for item in order_items_data
+        if isinstance(item, dict) and isinstance(item.get("product_id"), int)
+    }
+    if not product_ids:
+        return {}
+    return {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+
+# Trừ kho có điều kiện, trả về id sản phẩm không đủ hàng (None nếu tất cả thành công).
+# Phần hàng đang được người khác giữ không được bán; lượt giữ của chính user_id thì được tính là còn hàng.
+# Cập nhật theo thứ tự id tăng dần để các transaction đồng thời khóa dòng cùng thứ tự, tránh deadlock.
+def decrement_stock(quantities, user_id=None):
+    table = Product.__table__
+    reserved = reserved_quantity_subquery(table.c.id, exclude_user_id=user_id)
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == product_id, table.c.stock - reserved >= quantity)
+            .values(stock=table.c.stock - quantity)
+        )
+        if result.rowcount != 1:
+            return product_id
+    return None
+
+# Đặt hàng trong một transaction duy nhất: tính giá, trừ kho có điều kiện, ghi đơn và các dòng,
+# chuyển lượt giữ hàng của user thành trừ kho thật, xóa khỏi giỏ hàng, xếp hàng email xác nhận
+# và kiểm tra tồn kho thấp cho worker rồi commit một lần. Lỗi ở bất kỳ bước nào đều rollback toàn bộ.
+def place_order(user_id, order_items_data):
+    if not isinstance(order_items_data, list) or not all(isinstance(item, dict) for item in order_items_data):
+        return None, "order_items must be a list of objects"
+
+    products = load_order_products(order_items_data)
+    order_items, total_price, error = calculate_order_items_total(order_items_data, user_id, products)
+    if error:
+        db.session.rollback()
+        return None, error
+
+    quantities = {}
+    for item in order_items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+
+    out_of_stock = decrement_stock(quantities, user_id)
+    if out_of_stock is not None:
+        db.session.rollback()
+        return None, f"Not enough stock for product {out_of_stock}"
+
+    order = Order(user_id=user_id, total_price=total_price, status=OrderStatus.pending)
+    db.session.add(order)
+    db.session.flush()
+
+    db.session.execute(insert(OrderItem), [
+        {
+            "order_id": order.id,
+            "product_id": item["product_id"],
+            "quantity": item["quantity"],
+            "price": item["price"],
+            "discount_id": item["discount_id"]
+        }
+        for item in order_items
+    ])
+    CartItem.query.filter(
+        CartItem.user_id == user_id,
+        CartItem.product_id.in_(list(quantities))
+    ).delete(synchronize_session=False)
+    release_user_reservations(user_id, quantities)
+    order_placed(order, quantities)
+
+    commit_or_defer()
+    bump_version_after_commit(PRODUCT_STOCK_VERSION)
+    return order, None
+
+# Nạp sẵn các dòng đơn và sản phẩm của chúng bằng selectinload (mỗi quan hệ một truy vấn IN)
+def with_order_items(query):
+    return query.options(selectinload(Order.order_items).selectinload(OrderItem.product))
+
+# Ảnh mặc định của nhiều sản phẩm trong một truy vấn: product_id -> image_url
+def get_default_image_map(product_ids):
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+    rows = (
+        db.session.query(ProductImage.product_id, ProductImage.image_url)
+        .filter(ProductImage.product_id.in_(product_ids), ProductImage.is_default.is_(True))
+        .order_by(ProductImage.id)
+        .all()
+    )
+    images = {}
+    for product_id, image_url in rows:
+        images.setdefault(product_id, image_url)
+    return images
+
+def serialize_order(order, images):
+    return {
+        "id": order.id,
+        "total_price": order.total_price,
+        "status": order.status.value,
+        "created_at": order.created_at,
+        "items": [
+            {
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "discount_id": item.discount_id,
+                "product_image": images.get(item.product_id),
+                "product_name": item.product.name if item.product else None,
+                "price": item.price
+            } for item in order.order_items
+        ]
+    }
+
+# Serialize một lô đơn hàng đã nạp bằng with_order_items, thêm đúng một truy vấn ảnh cho cả lô
+def serialize_orders(orders):
+    images = get_default_image_map(item.product_id for order in orders for item in order.order_items)
+    return [serialize_order(order, images) for order in orders]
+
+# Đọc bộ lọc đơn hàng cho admin từ query string, trả về (filters, error).
+# created_to chỉ có ngày thì bao gồm cả ngày đó.
+def parse_order_filters(args):
+    filters = {}
+    statuses = [v.strip().lower() for raw in args.getlist("status") for v in raw.split(",") if v.strip()]
+    if statuses:
+        by_name = {status.value.lower(): status for status in OrderStatus}
+        unknown = [s for s in statuses if s not in by_name]
+        if unknown:
+            return None, f"Invalid order status: {unknown[0]}"
+        filters["status"] = [by_name[s] for s in statuses]
+
+    for key in ("created_from", "created_to"):
+        value = args.get(key)
+        if not value:
+            continue
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None, f"{key} must be an ISO date"
+        if key == "created_to" and len(value) == 10:
+            parsed += timedelta(days=1)
+            key = "created_before"
+        filters[key] = parsed
+
+    for key in ("user_id", "product_id"):
+        value = args.get(key)
+        if value is not None:
+            if not value.isdigit():
+                return None, f"{key} must be an integer"
+            filters[key] = int(value)
+
+    for key in ("min_total", "max_total"):
+        value = args.get(key)
+        if value is not None:
+            try:
+                filters[key] = float(value)
+            except ValueError:
+                return None, f"{key} must be a number"
+    return filters, None
+
+# Chuyển bộ lọc thành điều kiện SQL; status + created_at và user_id + created_at dùng index ghép tương ứng
+def order_filter_conditions(filters):
+    conditions = []
+    if "status" in filters:
+        conditions.append(Order.status.in_(filters["status"]))
+    if "created_from" in filters:
+        conditions.append(Order.created_at >= filters["created_from"])
+    if "created_to" in filters:
+        conditions.append(Order.created_at <= filters["created_to"])
+    if "created_before" in filters:
+        conditions.append(Order.created_at < filters["created_before"])
+    if "user_id" in filters:
+        conditions.append(Order.user_id == filters["user_id"])
+    if "product_id" in filters:
+        conditions.append(exists().where(
+            OrderItem.order_id == Order.id,
+            OrderItem.product_id == filters["product_id"]
+        ))
+    if "min_total" in filters:
+        conditions.append(Order.total_price >= filters["min_total"])
+    if "max_total" in filters:
+        conditions.append(Order.total_price <= filters["max_total"])
+    return conditions
+
+# Trạng thái đã trả hàng về kho; đơn ở các trạng thái này không được mở lại
+RESTOCK_STATUSES = (OrderStatus.canceled, OrderStatus.returned)
+
+# Chuyển các đơn sang canceled/returned và trả hàng về kho trong một transaction:
+# một câu UPDATE cộng lại số lượng cho mọi sản phẩm của các đơn, một câu UPDATE trả lại
+# các UserDiscount đã dùng cho từng dòng đơn. Đơn đã ở trạng thái hoàn kho thì bỏ qua để không cộng hai lần.
+# from_statuses (nếu có) giới hạn các trạng thái được phép chuyển, kiểm tra trên dòng đã khóa.
+# Trả về (id các đơn đã hoàn kho, id các sản phẩm bị ảnh hưởng).
+def restock_orders(order_ids, new_status, from_statuses=None):
+    conditions = [Order.id.in_(list(order_ids)), Order.status.notin_(RESTOCK_STATUSES)]
+    if from_statuses is not None:
+        conditions.append(Order.status.in_(list(from_statuses)))
+    orders = (
+        with_order_items(Order.query)
+        .filter(*conditions)
+        .order_by(Order.id)
+        .with_for_update()
+        .all()
+    )
+    if not orders:
+        db.session.rollback()
+        return [], []
+
+    restocked_ids = [order.id for order in orders]
+    product_ids = sorted({item.product_id for order in orders for item in order.order_items})
+
+    for order in orders:
+        old_status = order.status
+        order.status = new_status
+        order_status_changed(order, old_status, new_status)
+        order_status_updated(order)
+    db.session.flush()
+
+    if product_ids:
+        table = Product.__table__
+        returned = (
+            select(func.sum(OrderItem.quantity))
+            .where(OrderItem.product_id == table.c.id, OrderItem.order_id.in_(restocked_ids))
+            .scalar_subquery()
+        )
+        db.session.execute(
+            update(table)
+            .where(table.c.id.in_(product_ids))
+            .values(stock=table.c.stock + returned)
+        )
+
+    UserDiscount.query.filter(
+        UserDiscount.is_used.is_(True),
+        exists().where(
+            OrderItem.order_id == Order.id,
+            OrderItem.discount_id == UserDiscount.discount_id,
+            Order.user_id == UserDiscount.user_id,
+            Order.id.in_(restocked_ids)
+        )
+    ).update({"is_used": False}, synchronize_session=False)
+
+    product_stock_changed()
+    db.session.commit()
+    return restocked_ids, product_ids
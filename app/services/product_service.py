@@ -1,27 +1,35 @@
-from sqlalchemy import func
+import math
+from flask import current_app
+from sqlalchemy import func, select, update, bindparam
 from app.extensions import db
-from app.models import Product, ProductImage, Review, OrderItem, Order, OrderStatus
+from app.models import Product, ProductImage, ProductStats
 from app.services.image_service import save_image, delete_image
+from app.services.version_service import bump_version, get_versions
+from app.utils.cache import LRUTTLCache
+from app.utils.singleflight import SingleFlight
+from app.utils.streaming import iter_batches
 
-def get_product_with_details(product_id):
-    product = Product.query.get(product_id)
-    if not product:
-        return None
+PRODUCT_VERSION = "product"
+PRODUCT_STOCK_VERSION = "product_stock"
+PRODUCT_IMAGE_VERSION = "product_image"
+PRODUCT_STATS_VERSION = "product_stats"
 
-    images = [
-        {"id": img.id, "url": img.image_url, "is_default": img.is_default} 
-        for img in product.images
-    ]
+# Các bộ đếm mà danh sách sản phẩm phụ thuộc vào
+PRODUCT_LISTING_VERSIONS = (PRODUCT_VERSION, PRODUCT_STOCK_VERSION, PRODUCT_IMAGE_VERSION, PRODUCT_STATS_VERSION)
 
+product_detail_cache = LRUTTLCache()
+listing_flight = SingleFlight()
 
-    avg_rating = db.session.query(func.coalesce(func.avg(Review.rating), 0)).filter(Review.product_id == product.id).scalar()
-    rounded_rating = round(avg_rating) 
+def product_changed():
+    bump_version(PRODUCT_VERSION)
 
-    sold_quantity = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).join(Order).filter(
-        OrderItem.product_id == product.id, 
-        Order.status == OrderStatus.completed
-    ).scalar()
+def product_stock_changed():
+    bump_version(PRODUCT_STOCK_VERSION)
 
+def product_images_changed():
+    bump_version(PRODUCT_IMAGE_VERSION)
+
+def serialize_product(product, images, avg_rating, sold_quantity):
     return {
         "id": product.id,
         "name": product.name,
@@ -32,12 +40,221 @@ def get_product_with_details(product_id):
         "origin": product.origin,
         "brand": product.brand,
         "category_id": product.category_id,
-        "rate": int(rounded_rating), 
-        "sold": sold_quantity,
+        "rate": int(round(avg_rating)),
+        "sold": int(sold_quantity),
         "discount": product.discount,
         "images": images
     }
 
+def get_product_with_details(product_id):
+    details = get_products_with_details([product_id])
+    if not details:
+        return None
+    return details[0]
+
+def _product_payload(product_id):
+    details = get_product_with_details(product_id)
+    if details is None:
+        return None
+    return current_app.json.dumps(details)
+
+# Trả về chi tiết sản phẩm đã serialize thành JSON; khi cache trống hoặc hết hạn,
+# chỉ một request truy vấn DB, các request đồng thời chờ kết quả hoặc dùng bản cũ.
+# Mỗi phần tử gắn với các bộ đếm phiên bản lúc tính, nên thay đổi ở worker khác cũng làm nạp lại.
+def get_cached_product_payload(product_id):
+    versions = get_versions(*PRODUCT_LISTING_VERSIONS)
+    version = tuple(versions[name] for name in PRODUCT_LISTING_VERSIONS)
+    return product_detail_cache.get_or_compute(product_id, lambda: _product_payload(product_id), version)
+
+# Gọi sau khi commit để request sau đọc được dữ liệu mới
+def invalidate_product_details(*product_ids):
+    product_detail_cache.invalidate(*product_ids)
+
+# Lấy chi tiết nhiều sản phẩm với số lượng truy vấn cố định (sản phẩm, ảnh, thống kê)
+def get_products_with_details(products):
+    if isinstance(products, (list, tuple, set)):
+        products = list(products)
+        if products and not isinstance(products[0], Product):
+            by_id = {p.id: p for p in Product.query.filter(Product.id.in_(products)).all()}
+            products = [by_id[pid] for pid in products if pid in by_id]
+    else:
+        products = products.all()
+
+    if not products:
+        return []
+    product_ids = [p.id for p in products]
+
+    images = {}
+    for img in ProductImage.query.filter(ProductImage.product_id.in_(product_ids)).order_by(ProductImage.id).all():
+        images.setdefault(img.product_id, []).append(
+            {"id": img.id, "url": img.image_url, "is_default": img.is_default}
+        )
+
+    stats = {
+        st.product_id: st
+        for st in ProductStats.query.filter(ProductStats.product_id.in_(product_ids)).all()
+    }
+
+    return [
+        serialize_product(
+            p,
+            images.get(p.id, []),
+            stats[p.id].avg_rating if p.id in stats else 0,
+            stats[p.id].sold_quantity if p.id in stats else 0
+        )
+        for p in products
+    ]
+
+# Sinh chi tiết sản phẩm theo từng lô để bộ nhớ không tăng theo kích thước bảng
+def iter_products_with_details(query, batch_size=500):
+    for products in iter_batches(query, Product.id, batch_size):
+        yield from get_products_with_details(products)
+
+FACET_FIELDS = ("brand", "origin", "material")
+
+def parse_product_filters(args):
+    filters = {}
+    for field in FACET_FIELDS:
+        values = [v.strip() for raw in args.getlist(field) for v in raw.split(",") if v.strip()]
+        if values:
+            filters[field] = values
+    for key in ("min_price", "max_price", "min_rating"):
+        value = args.get(key, type=float)
+        if value is not None:
+            filters[key] = value
+    if args.get("in_stock", "false").lower() == "true":
+        filters["in_stock"] = True
+    return filters
+
+# Chuyển bộ lọc thành điều kiện SQL; exclude dùng khi đếm facet để bỏ qua chính bộ lọc của facet đó
+def product_filter_conditions(filters, category_ids=None, exclude=None):
+    conditions = []
+    if category_ids is not None:
+        conditions.append(Product.category_id.in_(category_ids))
+    for field in FACET_FIELDS:
+        if field != exclude and field in filters:
+            conditions.append(getattr(Product, field).in_(filters[field]))
+    if "min_price" in filters:
+        conditions.append(Product.price >= filters["min_price"])
+    if "max_price" in filters:
+        conditions.append(Product.price <= filters["max_price"])
+    if filters.get("in_stock") and exclude != "in_stock":
+        conditions.append(Product.stock > 0)
+    if "min_rating" in filters:
+        conditions.append(Product.id.in_(
+            select(ProductStats.product_id).where(
+                ProductStats.review_count > 0,
+                ProductStats.rating_sum >= filters["min_rating"] * ProductStats.review_count
+            )
+        ))
+    return conditions
+
+def filter_products_query(filters, category_ids=None):
+    return Product.query.filter(*product_filter_conditions(filters, category_ids))
+
+# Đếm số sản phẩm theo từng giá trị brand/origin/material và số sản phẩm còn hàng
+def get_product_facets(filters, category_ids=None):
+    facets = {}
+    for field in FACET_FIELDS:
+        column = getattr(Product, field)
+        rows = (
+            db.session.query(column, func.count(Product.id))
+            .filter(column.isnot(None), *product_filter_conditions(filters, category_ids, exclude=field))
+            .group_by(column)
+            .order_by(func.count(Product.id).desc(), column)
+            .all()
+        )
+        facets[field] = [{"value": value, "count": count} for value, count in rows]
+
+    facets["in_stock"] = (
+        db.session.query(func.count(Product.id))
+        .filter(Product.stock > 0, *product_filter_conditions(filters, category_ids, exclude="in_stock"))
+        .scalar()
+    )
+    return facets
+
+BULK_UPDATE_FIELDS = ("price", "stock", "stock_delta", "discount")
+MAX_BULK_UPDATE = 5000
+
+def _validate_bulk_entry(entry):
+    if not isinstance(entry, dict) or not isinstance(entry.get("id"), int):
+        return "Each entry needs an integer id"
+    if not any(field in entry for field in BULK_UPDATE_FIELDS):
+        return "Nothing to update"
+    if "stock" in entry and "stock_delta" in entry:
+        return "Use either stock or stock_delta, not both"
+    price = entry.get("price")
+    if "price" in entry and (
+        not isinstance(price, (int, float)) or isinstance(price, bool) or not math.isfinite(price) or price < 0
+    ):
+        return "price must be a finite non-negative number"
+    for field in ("stock", "stock_delta", "discount"):
+        if field in entry and (not isinstance(entry[field], int) or isinstance(entry[field], bool)):
+            return f"{field} must be an integer"
+    if entry.get("stock", 0) < 0:
+        return "stock cannot be negative"
+    if "discount" in entry and not 0 <= entry["discount"] <= 100:
+        return "discount must be between 0 and 100"
+    return None
+
+# Cập nhật giá/tồn kho/giảm giá của nhiều sản phẩm trong một transaction bằng các câu UPDATE theo lô.
+# stock_delta là thay đổi tương đối, bị từ chối nếu làm tồn kho âm.
+def bulk_update_products(entries):
+    results = []
+    valid = {}
+    for entry in entries:
+        error = _validate_bulk_entry(entry)
+        product_id = entry.get("id") if isinstance(entry, dict) else None
+        if not error and product_id in valid:
+            error = "Duplicate id"
+        result = {"id": product_id, "status": "error", "error": error}
+        results.append(result)
+        if not error:
+            valid[product_id] = (entry, result)
+
+    current_stock = dict(
+        db.session.query(Product.id, Product.stock)
+        .filter(Product.id.in_(list(valid)))
+        .with_for_update()
+        .all()
+    ) if valid else {}
+
+    absolute, deltas, updated_ids = [], [], []
+    for product_id, (entry, result) in valid.items():
+        if product_id not in current_stock:
+            result["error"] = "Product not found"
+            continue
+        if "stock_delta" in entry and current_stock[product_id] + entry["stock_delta"] < 0:
+            result["error"] = f"Not enough stock. Available: {current_stock[product_id]}"
+            continue
+        values = {field: entry[field] for field in ("price", "stock", "discount") if field in entry}
+        if values:
+            absolute.append(dict(values, id=product_id))
+        if "stock_delta" in entry:
+            deltas.append({"pid": product_id, "delta": entry["stock_delta"]})
+        result.clear()
+        result.update({
+            "id": product_id,
+            "status": "updated",
+            "stock": entry.get("stock", current_stock[product_id] + entry.get("stock_delta", 0))
+        })
+        updated_ids.append(product_id)
+
+    if absolute:
+        db.session.execute(update(Product), absolute)
+    if deltas:
+        db.session.execute(
+            update(Product.__table__)
+            .where(Product.__table__.c.id == bindparam("pid"))
+            .values(stock=Product.__table__.c.stock + bindparam("delta")),
+            deltas
+        )
+    if updated_ids:
+        product_changed()
+    db.session.commit()
+    invalidate_product_details(*updated_ids)
+    return results, len(updated_ids)
+
 def set_default_image(product_id, image_url):
     ProductImage.query.filter_by(product_id=product_id).update({"is_default": False})
 
@@ -50,6 +267,7 @@ def set_default_image(product_id, image_url):
         new_image = ProductImage(product_id=product_id, image_url=image_url, is_default=True)
         db.session.add(new_image)
 
+    product_images_changed()
     db.session.commit()
 
 
@@ -60,5 +278,6 @@ def save_product_image(product_id, file):
 
     image = ProductImage(product_id=product_id, image_url=image_url)
     db.session.add(image)
+    product_images_changed()
     db.session.commit()
     return image.image_url, None
@@ -0,0 +1,191 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from app.extensions import db
+from app.utils.helpers import increment_or_create
+from app.models import (
+    Order, OrderItem, OrderStatus, Product, Category, Discount,
+    DailySales, DailyProductSales, DailyCategorySales, DailyDiscountUsage
+)
+
+ROLLUP_MODELS = (DailySales, DailyProductSales, DailyCategorySales, DailyDiscountUsage)
+
+def _add_total(totals, key, count, revenue):
+    if key is None:
+        return
+    entry = totals.setdefault(key, [0, 0])
+    entry[0] += count
+    entry[1] += revenue
+
+# Cập nhật các bảng tổng hợp khi đơn vào (sign=1) hoặc rời (sign=-1) trạng thái completed.
+# Số liệu tính theo ngày tạo đơn và danh mục hiện tại của sản phẩm, giống rebuild_daily_rollups.
+# Doanh thu ở mọi bảng là tổng thành tiền các dòng (OrderItem.price), nên các bảng luôn khớp nhau.
+def order_rollup_changed(order, sign):
+    day = (order.created_at or datetime.utcnow()).date()
+    items = order.order_items
+    categories = dict(
+        db.session.query(Product.id, Product.category_id)
+        .filter(Product.id.in_({item.product_id for item in items}))
+        .all()
+    ) if items else {}
+
+    products, by_category, discounts = {}, {}, {}
+    units = 0
+    revenue = 0
+    for item in items:
+        units += item.quantity
+        revenue += item.price
+        _add_total(products, item.product_id, item.quantity, item.price)
+        _add_total(by_category, categories.get(item.product_id), item.quantity, item.price)
+        _add_total(discounts, item.discount_id, 1, item.price)
+
+    increment_or_create(DailySales, {"date": day}, {
+        "order_count": sign, "units": sign * units, "revenue": sign * revenue
+    })
+    for product_id, (quantity, revenue) in sorted(products.items()):
+        increment_or_create(DailyProductSales, {"date": day, "product_id": product_id},
+                            {"units": sign * quantity, "revenue": sign * revenue})
+    for category_id, (quantity, revenue) in sorted(by_category.items()):
+        increment_or_create(DailyCategorySales, {"date": day, "category_id": category_id},
+                            {"units": sign * quantity, "revenue": sign * revenue})
+    for discount_id, (count, revenue) in sorted(discounts.items()):
+        increment_or_create(DailyDiscountUsage, {"date": day, "discount_id": discount_id},
+                            {"usage_count": sign * count, "revenue": sign * revenue})
+
+# Tính lại các bảng tổng hợp từ dữ liệu đơn hàng, từ ngày since (hoặc toàn bộ nếu None)
+def rebuild_daily_rollups(since=None):
+    day = func.date(Order.created_at, type_=db.Date)
+    completed = [Order.status == OrderStatus.completed]
+    if since is not None:
+        completed.append(Order.created_at >= datetime.combine(since, datetime.min.time()))
+
+    for model in ROLLUP_MODELS:
+        query = model.query
+        if since is not None:
+            query = query.filter(model.date >= since)
+        query.delete(synchronize_session=False)
+
+    daily_items = {
+        d: (units, revenue) for d, units, revenue in
+        db.session.query(day, func.sum(OrderItem.quantity), func.sum(OrderItem.price))
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(*completed)
+        .group_by(day)
+        .all()
+    }
+    sales = [
+        {"date": d, "order_count": count, "units": int(daily_items.get(d, (0, 0))[0] or 0),
+         "revenue": daily_items.get(d, (0, 0))[1] or 0}
+        for d, count in db.session.query(day, func.count(Order.id))
+        .filter(*completed)
+        .group_by(day)
+        .all()
+    ]
+
+    item_rows = db.session.query(OrderItem).join(Order, OrderItem.order_id == Order.id).filter(*completed)
+    products = [
+        {"date": d, "product_id": product_id, "units": int(units), "revenue": revenue or 0}
+        for d, product_id, units, revenue in item_rows
+        .with_entities(day, OrderItem.product_id, func.sum(OrderItem.quantity), func.sum(OrderItem.price))
+        .group_by(day, OrderItem.product_id)
+        .all()
+    ]
+    categories = [
+        {"date": d, "category_id": category_id, "units": int(units), "revenue": revenue or 0}
+        for d, category_id, units, revenue in item_rows
+        .join(Product, OrderItem.product_id == Product.id)
+        .filter(Product.category_id.isnot(None))
+        .with_entities(day, Product.category_id, func.sum(OrderItem.quantity), func.sum(OrderItem.price))
+        .group_by(day, Product.category_id)
+        .all()
+    ]
+    discounts = [
+        {"date": d, "discount_id": discount_id, "usage_count": count, "revenue": revenue or 0}
+        for d, discount_id, count, revenue in item_rows
+        .filter(OrderItem.discount_id.isnot(None))
+        .with_entities(day, OrderItem.discount_id, func.count(OrderItem.id), func.sum(OrderItem.price))
+        .group_by(day, OrderItem.discount_id)
+        .all()
+    ]
+
+    for model, rows in ((DailySales, sales), (DailyProductSales, products),
+                        (DailyCategorySales, categories), (DailyDiscountUsage, discounts)):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+    db.session.commit()
+    return len(sales)
+
+# Đọc khoảng ngày from/to (ISO, bao gồm cả hai đầu) từ query string, mặc định 30 ngày gần nhất
+def parse_report_range(args, default_days=30):
+    try:
+        end = date.fromisoformat(args["to"]) if args.get("to") else datetime.utcnow().date()
+        start = date.fromisoformat(args["from"]) if args.get("from") else end - timedelta(days=default_days - 1)
+    except ValueError:
+        return None, None, "from and to must be ISO dates (YYYY-MM-DD)"
+    if start > end:
+        return None, None, "from must not be after to"
+    return start, end, None
+
+def get_daily_sales(start, end):
+    rows = (
+        DailySales.query
+        .filter(DailySales.date.between(start, end), DailySales.order_count > 0)
+        .order_by(DailySales.date)
+        .all()
+    )
+    return [
+        {"date": row.date.isoformat(), "order_count": row.order_count, "units": row.units, "revenue": row.revenue}
+        for row in rows
+    ]
+
+def get_top_products(start, end, limit=10):
+    units = func.sum(DailyProductSales.units)
+    revenue = func.sum(DailyProductSales.revenue)
+    rows = (
+        db.session.query(DailyProductSales.product_id, Product.name, units, revenue)
+        .join(Product, Product.id == DailyProductSales.product_id)
+        .filter(DailyProductSales.date.between(start, end))
+        .group_by(DailyProductSales.product_id, Product.name)
+        .having(units > 0)
+        .order_by(units.desc(), DailyProductSales.product_id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {"product_id": product_id, "name": name, "units": int(u), "revenue": r}
+        for product_id, name, u, r in rows
+    ]
+
+def get_top_categories(start, end, limit=10):
+    units = func.sum(DailyCategorySales.units)
+    revenue = func.sum(DailyCategorySales.revenue)
+    rows = (
+        db.session.query(DailyCategorySales.category_id, Category.name, units, revenue)
+        .join(Category, Category.id == DailyCategorySales.category_id)
+        .filter(DailyCategorySales.date.between(start, end))
+        .group_by(DailyCategorySales.category_id, Category.name)
+        .having(units > 0)
+        .order_by(revenue.desc(), DailyCategorySales.category_id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {"category_id": category_id, "name": name, "units": int(u), "revenue": r}
+        for category_id, name, u, r in rows
+    ]
+
+def get_discount_usage(start, end):
+    usage = func.sum(DailyDiscountUsage.usage_count)
+    revenue = func.sum(DailyDiscountUsage.revenue)
+    rows = (
+        db.session.query(DailyDiscountUsage.discount_id, Discount.code, usage, revenue)
+        .outerjoin(Discount, Discount.id == DailyDiscountUsage.discount_id)
+        .filter(DailyDiscountUsage.date.between(start, end))
+        .group_by(DailyDiscountUsage.discount_id, Discount.code)
+        .having(usage > 0)
+        .order_by(usage.desc(), DailyDiscountUsage.discount_id)
+        .all()
+    )
+    return [
+        {"discount_id": discount_id, "code": code, "usage_count": int(u), "revenue": r}
+        for discount_id, code, u, r in rows
+    ]
@@ -0,0 +1,121 @@
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, insert, select
+from app.extensions import db
+from app.models import CartItem, Product, StockReservation
+
+def active_reservations(now=None, exclude_user_id=None):
+    now = now or datetime.utcnow()
+    conditions = [StockReservation.expires_at > now]
+    if exclude_user_id is not None:
+        conditions.append(StockReservation.user_id != exclude_user_id)
+    return conditions
+
+# Tổng số lượng đang được giữ của một sản phẩm, dùng làm subquery tương quan trong UPDATE trừ kho
+def reserved_quantity_subquery(product_id_column, exclude_user_id=None, now=None):
+    return (
+        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+        .where(StockReservation.product_id == product_id_column, *active_reservations(now, exclude_user_id))
+        .scalar_subquery()
+    )
+
+# Số lượng còn bán được = tồn kho - các lượt giữ còn hạn (không tính lượt giữ của chính user).
+# Một truy vấn GROUP BY cho cả lô sản phẩm, dùng index (product_id, expires_at).
+def available_to_sell(product_ids, exclude_user_id=None):
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    reserved = (
+        select(StockReservation.product_id, func.sum(StockReservation.quantity).label("quantity"))
+        .where(StockReservation.product_id.in_(product_ids), *active_reservations(exclude_user_id=exclude_user_id))
+        .group_by(StockReservation.product_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Product.id, Product.stock - func.coalesce(reserved.c.quantity, 0))
+        .outerjoin(reserved, reserved.c.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+    ).all()
+    return {product_id: max(int(available), 0) for product_id, available in rows}
+
+def get_user_reservations(user_id):
+    return (
+        StockReservation.query
+        .filter(StockReservation.user_id == user_id, *active_reservations())
+        .order_by(StockReservation.product_id)
+        .all()
+    )
+
+def release_user_reservations(user_id, product_ids=None):
+    query = StockReservation.query.filter(StockReservation.user_id == user_id)
+    if product_ids is not None:
+        query = query.filter(StockReservation.product_id.in_(list(product_ids)))
+    return query.delete(synchronize_session=False)
+
+# Giữ hàng khi bắt đầu thanh toán. items là dict product_id -> quantity; nếu None thì lấy từ giỏ hàng.
+# Các lượt giữ cũ của user được thay thế. Khóa các dòng sản phẩm theo thứ tự id để các checkout
+# đồng thời trên cùng sản phẩm chạy tuần tự, sau đó kiểm tra số lượng còn bán được.
+def reserve_items(user_id, items=None, ttl=None):
+    if items is None:
+        items = {}
+        for cart_item in CartItem.query.filter_by(user_id=user_id).all():
+            items[cart_item.product_id] = items.get(cart_item.product_id, 0) + cart_item.quantity
+    if not items:
+        return None, "Nothing to reserve"
+
+    ttl = ttl or current_app.config["RESERVATION_TTL"]
+    release_user_reservations(user_id)
+
+    locked = {
+        p.id for p in Product.query.filter(Product.id.in_(list(items))).order_by(Product.id).with_for_update().all()
+    }
+    missing = sorted(set(items) - locked)
+    if missing:
+        db.session.rollback()
+        return None, f"Product with id {missing[0]} not found"
+
+    available = available_to_sell(items, exclude_user_id=user_id)
+    for product_id in sorted(items):
+        if items[product_id] > available[product_id]:
+            db.session.rollback()
+            return None, f"Not enough stock for product {product_id}. Available: {available[product_id]}, Requested: {items[product_id]}"
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    db.session.execute(insert(StockReservation), [
+        {
+            "user_id": user_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "expires_at": expires_at,
+            "created_at": now
+        }
+        for product_id, quantity in sorted(items.items())
+    ])
+    db.session.commit()
+    return expires_at, None
+
+# Xóa hàng loạt các lượt giữ đã hết hạn, trả về số dòng đã xóa
+def release_expired_reservations():
+    deleted = StockReservation.query.filter(
+        StockReservation.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+# Vòng lặp dọn các lượt giữ hết hạn mỗi interval giây, chạy như một tiến trình riêng (flask reservations-sweep).
+# Lượt giữ hết hạn đã không còn được tính ngay khi quá expires_at, vòng lặp này chỉ dọn bảng.
+def run_reservation_sweeper(app, interval):
+    while True:
+        with app.app_context():
+            try:
+                count = release_expired_reservations()
+                if count:
+                    app.logger.info("Released %s expired reservations", count)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Failed to release expired reservations")
+            finally:
+                db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,148 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from sqlalchemy import text
+from app.extensions import db
+from app.models import Product
+from app.services.version_service import get_version
+from app.services.product_service import PRODUCT_VERSION
+
+# Trọng số theo cột, cùng thứ tự với bảng FTS
+SEARCH_FIELDS = ("name", "description", "brand", "material", "origin")
+FIELD_WEIGHTS = (10.0, 1.0, 5.0, 2.0, 2.0)
+
+_fts_enabled = False
+
+def normalize_text(value):
+    value = unicodedata.normalize("NFKD", (value or "").lower())
+    return "".join(ch for ch in value if not unicodedata.combining(ch))
+
+def tokenize(value):
+    return re.findall(r"\w+", normalize_text(value))
+
+# Tạo bảng FTS5 và trigger đồng bộ với bảng product (chỉ với SQLite)
+def init_search_index():
+    global _fts_enabled
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    columns = ", ".join(SEARCH_FIELDS)
+    new_values = ", ".join(f"new.{field}" for field in SEARCH_FIELDS)
+    old_values = ", ".join(f"old.{field}" for field in SEARCH_FIELDS)
+    with db.engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+        )).first()
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE product_fts USING fts5({columns}, "
+                    "content='product', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                ))
+            except Exception:
+                return
+            conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+            f"INSERT INTO product_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+            f"INSERT INTO product_fts(product_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        ))
+        # Chỉ đồng bộ khi cột được tìm kiếm thay đổi, không chạy khi cập nhật tồn kho hay giá.
+        # CSDL cũ có trigger AFTER UPDATE ON product (mọi cột) thì xóa để tạo lại.
+        update_trigger = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'product_fts_au'"
+        )).scalar()
+        if update_trigger and "UPDATE OF" not in update_trigger.upper():
+            conn.execute(text("DROP TRIGGER product_fts_au"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF {columns} ON product BEGIN "
+            f"INSERT INTO product_fts(product_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO product_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        ))
+    _fts_enabled = True
+
+def _search_fts(tokens, limit, offset):
+    match = " ".join(f'"{token}"*' for token in tokens)
+    weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS)
+    total = db.session.execute(
+        text("SELECT count(*) FROM product_fts WHERE product_fts MATCH :match"),
+        {"match": match}
+    ).scalar()
+    rows = db.session.execute(
+        text(
+            "SELECT rowid FROM product_fts WHERE product_fts MATCH :match "
+            f"ORDER BY bm25(product_fts, {weights}), rowid LIMIT :limit OFFSET :offset"
+        ),
+        {"match": match, "limit": limit, "offset": offset}
+    ).all()
+    return [row[0] for row in rows], total
+
+
+# Chỉ mục ngược trong bộ nhớ, dùng khi CSDL không hỗ trợ FTS5
+class InvertedIndex:
+    def __init__(self, version, rows):
+        self.version = version
+        self.postings = {}
+        for row in rows:
+            product_id = row[0]
+            for value, weight in zip(row[1:], FIELD_WEIGHTS):
+                for token in tokenize(value):
+                    doc_weights = self.postings.setdefault(token, {})
+                    doc_weights[product_id] = doc_weights.get(product_id, 0) + weight
+        self.vocabulary = sorted(self.postings)
+        self.doc_count = len(rows)
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, tokens):
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term in self._expand(token):
+                doc_weights = self.postings[term]
+                idf = math.log(1 + self.doc_count / len(doc_weights))
+                for product_id, weight in doc_weights.items():
+                    token_scores[product_id] = token_scores.get(product_id, 0) + weight * idf
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda pid: (-scores[pid], pid))
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_inverted_index():
+    global _index
+    version = get_version(PRODUCT_VERSION)
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                columns = [getattr(Product, field) for field in SEARCH_FIELDS]
+                _index = InvertedIndex(version, db.session.query(Product.id, *columns).all())
+            index = _index
+    return index
+
+# Tìm sản phẩm, trả về (danh sách id theo thứ tự liên quan, tổng số kết quả)
+def search_product_ids(query, limit, offset=0):
+    tokens = tokenize(query)
+    if not tokens:
+        return [], 0
+    if _fts_enabled:
+        return _search_fts(tokens, limit, offset)
+    product_ids = get_inverted_index().search(tokens)
+    return product_ids[offset:offset + limit], len(product_ids)
@@ -0,0 +1,86 @@
+from sqlalchemy import func
+from app.extensions import db
+from app.utils.helpers import increment_or_create
+from app.models import Product, ProductStats, Review, OrderItem, Order, OrderStatus
+from app.services.version_service import bump_version
+from app.services.product_service import PRODUCT_STATS_VERSION
+from app.services.report_service import order_rollup_changed
+
+# Cộng dồn thay đổi vào bảng thống kê, tạo dòng mới nếu sản phẩm chưa có thống kê.
+# Không commit: thay đổi nằm trong cùng transaction với thao tác ghi gây ra nó.
+def apply_stats_delta(product_id, rating_sum=0, review_count=0, sold_quantity=0):
+    increment_or_create(ProductStats, {"product_id": product_id}, {
+        "rating_sum": rating_sum,
+        "review_count": review_count,
+        "sold_quantity": sold_quantity
+    })
+
+def review_added(review):
+    apply_stats_delta(review.product_id, rating_sum=review.rating, review_count=1)
+    bump_version(PRODUCT_STATS_VERSION)
+
+def review_rating_changed(review, old_rating):
+    if review.rating != old_rating:
+        apply_stats_delta(review.product_id, rating_sum=review.rating - old_rating)
+        bump_version(PRODUCT_STATS_VERSION)
+
+def review_deleted(review):
+    apply_stats_delta(review.product_id, rating_sum=-review.rating, review_count=-1)
+    bump_version(PRODUCT_STATS_VERSION)
+
+# Cập nhật số lượng đã bán và các bảng tổng hợp theo ngày khi đơn hàng vào hoặc rời trạng thái completed
+def order_status_changed(order, old_status, new_status):
+    if old_status == new_status:
+        return
+    if new_status == OrderStatus.completed:
+        sign = 1
+    elif old_status == OrderStatus.completed:
+        sign = -1
+    else:
+        return
+
+    quantities = {}
+    for item in order.order_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    for product_id, quantity in quantities.items():
+        apply_stats_delta(product_id, sold_quantity=sign * quantity)
+    order_rollup_changed(order, sign)
+    bump_version(PRODUCT_STATS_VERSION)
+
+# Tính lại toàn bộ thống kê từ dữ liệu gốc để sửa sai lệch
+def rebuild_product_stats():
+    ratings = dict(
+        (product_id, (rating_sum, review_count))
+        for product_id, rating_sum, review_count in db.session.query(
+            Review.product_id, func.sum(Review.rating), func.count(Review.id)
+        ).group_by(Review.product_id).all()
+    )
+    sold = dict(
+        db.session.query(OrderItem.product_id, func.sum(OrderItem.quantity))
+        .join(Order)
+        .filter(Order.status == OrderStatus.completed)
+        .group_by(OrderItem.product_id)
+        .all()
+    )
+
+    ProductStats.query.delete(synchronize_session=False)
+    rows = []
+    for (product_id,) in db.session.query(Product.id).all():
+        rating_sum, review_count = ratings.get(product_id, (0, 0))
+        rows.append({
+            "product_id": product_id,
+            "rating_sum": int(rating_sum or 0),
+            "review_count": int(review_count or 0),
+            "sold_quantity": int(sold.get(product_id) or 0),
+        })
+    if rows:
+        db.session.execute(ProductStats.__table__.insert(), rows)
+    bump_version(PRODUCT_STATS_VERSION)
+    db.session.commit()
+    return len(rows)
+
+# Lần chạy đầu sau khi thêm bảng thống kê: tính từ dữ liệu có sẵn, nếu không mọi sản phẩm cũ
+# hiển thị 0 và thay đổi đầu tiên sẽ tạo dòng chỉ từ một delta
+def ensure_product_stats():
+    if ProductStats.query.first() is None and Product.query.first() is not None:
+        rebuild_product_stats()
@@ -0,0 +1,37 @@
+from flask import current_app
+from app.extensions import db
+from app.models import DataVersion
+from app.utils.idempotency import after_commit
+from app.utils.helpers import increment_or_create
+
+# Bộ đếm phiên bản dùng chung giữa các process: mỗi lần ghi vào một nhóm dữ liệu
+# thì tăng version trong cùng transaction, cache trong từng process so sánh để biết khi nào cần nạp lại.
+
+def get_version(name):
+    version = db.session.query(DataVersion.version).filter_by(name=name).scalar()
+    return version or 0
+
+def bump_version(name):
+    increment_or_create(DataVersion, {"name": name}, {"version": 1})
+
+def _bump_version_now(name):
+    try:
+        bump_version(name)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Failed to bump version %s", name)
+
+# Tăng bộ đếm trong một transaction ngắn riêng sau khi thao tác ghi đã commit. Dùng cho các luồng ghi
+# nóng (đặt hàng, thu thập mã) với bộ đếm chỉ phục vụ ETag/cache, để các transaction đó không cùng
+# giữ khóa dòng data_version đến lúc commit. Gọi sau commit_or_defer().
+def bump_version_after_commit(name):
+    after_commit(_bump_version_now, name)
+
+def get_versions(*names):
+    versions = dict(
+        db.session.query(DataVersion.name, DataVersion.version)
+        .filter(DataVersion.name.in_(names))
+        .all()
+    )
+    return {name: versions.get(name, 0) for name in names}
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from app.utils.singleflight import SingleFlight
+
+# Cache giới hạn kích thước, loại bỏ phần tử ít dùng nhất (LRU) và hết hạn sau ttl giây.
+# Trong stale_ttl giây sau khi hết hạn, get_or_compute trả ngay giá trị cũ và tính lại ở luồng nền.
+# Mỗi key có một generation tăng khi invalidate: kết quả tính từ trước khi invalidate sẽ không được lưu.
+# get_or_compute nhận thêm version (vd các bộ đếm DataVersion): phần tử lưu với version khác bị coi như
+# không có, nhờ vậy thay đổi ở process khác cũng làm cache của process này nạp lại.
+class LRUTTLCache:
+    def __init__(self, maxsize=1024, ttl=60, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._generations = {}
+        self._epoch = 0
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def configure(self, maxsize=None, ttl=None, stale_ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            if stale_ttl is not None:
+                self.stale_ttl = stale_ttl
+            self._evict()
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # Trả về (value, is_fresh); (None, False) nếu không có, đã quá hạn stale hoặc khác version
+    def _lookup(self, key, version=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            value, expires_at, entry_version = entry
+            now = time.monotonic()
+            if version is not None and entry_version != version:
+                del self._data[key]
+                self.misses += 1
+                return None, False
+            if expires_at + self.stale_ttl <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+            self._data.move_to_end(key)
+            if expires_at <= now:
+                self.stale_hits += 1
+                return value, False
+            self.hits += 1
+            return value, True
+
+    def get(self, key, version=None):
+        value, fresh = self._lookup(key, version)
+        return value if fresh else None
+
+    def _generation(self, key):
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def get_or_compute(self, key, compute, version=None):
+        value, fresh = self._lookup(key, version)
+        if fresh:
+            return value
+        if value is not None:
+            self._revalidate(key, compute, version)
+            return value
+        # Key của singleflight kèm generation và version: request đến sau invalidate không dùng chung lần tính cũ
+        generation = self._generation(key)
+        return self._flight.do(
+            (key, generation, version), lambda: self._compute_and_set(key, compute, generation, version)
+        )
+
+    # Tính lại giá trị stale ở luồng nền (mỗi key tối đa một luồng), chạy trong app context của request
+    def _revalidate(self, key, compute, version=None):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def refresh():
+            generation = self._generation(key)
+            self._flight.do(
+                (key, generation, version), lambda: self._compute_and_set(key, compute, generation, version)
+            )
+
+        def run():
+            try:
+                if app is None:
+                    refresh()
+                else:
+                    with app.app_context():
+                        refresh()
+            except Exception:
+                if app is not None:
+                    app.logger.exception("Background cache refresh failed for key %r", key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _compute_and_set(self, key, compute, generation, version=None):
+        value = compute()
+        if value is not None:
+            self.set(key, value, generation, version)
+        return value
+
+    # generation (nếu có) là giá trị lấy lúc bắt đầu tính; bỏ qua nếu key đã bị invalidate từ đó
+    def set(self, key, value, generation=None, version=None):
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl, version)
+            self._data.move_to_end(key)
+            self._evict()
+            return True
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+            }
@@ -0,0 +1,34 @@
+import hashlib
+import time
+from functools import wraps
+from flask import request, make_response
+from app.services.version_service import get_versions
+
+# ETag tính từ bộ đếm phiên bản của các bảng liên quan và query string, không cần serialize body.
+# Nếu client gửi If-None-Match khớp thì trả 304 ngay, không chạy hàm xử lý.
+# time_bucket (giây) dùng cho dữ liệu phụ thuộc thời điểm hiện tại, ví dụ trạng thái còn hiệu lực của mã giảm giá.
+def versioned_etag(*names, time_bucket=None):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            versions = get_versions(*names)
+            parts = [f"{name}:{versions[name]}" for name in names]
+            if time_bucket:
+                parts.append(f"t:{int(time.time() // time_bucket)}")
+            parts.append(request.path)
+            parts.append(request.query_string.decode("utf-8", "replace"))
+            etag = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+            if etag in request.if_none_match:
+                response = make_response("", 304)
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+        return decorator
+    return wrapper
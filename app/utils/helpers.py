@@ -0,0 +1,19 @@
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+
+# Cộng values vào dòng có khóa keys của model, tạo dòng mới nếu chưa có. Nếu một transaction khác
+# vừa tạo dòng đó trước (trùng khóa chính) thì quay lại savepoint và UPDATE lại. Không commit.
+def increment_or_create(model, keys, values):
+    def increment():
+        return model.query.filter_by(**keys).update(
+            {getattr(model, name): getattr(model, name) + value for name, value in values.items()},
+            synchronize_session=False
+        )
+
+    if increment():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **values))
+    except IntegrityError:
+        increment()
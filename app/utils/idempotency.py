@@ -0,0 +1,150 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+def _sha256(value):
+    return hashlib.sha256(value).hexdigest()
+
+def _replay(record):
+    response = current_app.response_class(record.response_body, status=record.status_code, mimetype=record.mimetype)
+    response.headers[REPLAY_HEADER] = "true"
+    return response
+
+# Giữ chỗ cho key: trả về None nếu request này được xử lý, hoặc phản hồi cần trả ngay
+# (kết quả đã lưu, request đầu đang xử lý, hoặc key đã dùng cho request khác)
+def _acquire(key_hash, request_hash, ttl):
+    now = datetime.utcnow()
+    record = db.session.get(IdempotencyKey, key_hash)
+    if record and record.expires_at <= now:
+        db.session.delete(record)
+        db.session.commit()
+        record = None
+
+    if record is None:
+        db.session.add(IdempotencyKey(
+            key_hash=key_hash,
+            request_hash=request_hash,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            record = db.session.get(IdempotencyKey, key_hash)
+            if record is None:
+                return jsonify({"message": "A request with this Idempotency-Key is in progress"}), 409
+        else:
+            return None
+
+    if record.request_hash != request_hash:
+        return jsonify({"message": "Idempotency-Key was already used for a different request"}), 422
+    if record.status_code is not None:
+        return _replay(record)
+
+    # Request đầu tiên giữ chỗ quá lâu (worker chết giữa chừng) thì cho request này xử lý lại.
+    # An toàn vì thao tác ghi và phản hồi được commit cùng nhau: key chưa có phản hồi nghĩa là chưa ghi gì.
+    stale_before = now - timedelta(seconds=current_app.config["IDEMPOTENCY_LOCK_TIMEOUT"])
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.key_hash == key_hash,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at < stale_before
+    ).update({"created_at": now}, synchronize_session=False)
+    db.session.commit()
+    if taken:
+        return None
+    return jsonify({"message": "A request with this Idempotency-Key is in progress"}), 409
+
+# Dùng thay cho db.session.commit() trong hàm xử lý được bọc bởi idempotent: khi request có
+# Idempotency-Key chỉ flush, decorator sẽ commit thao tác ghi cùng phản hồi đã lưu trong một transaction
+def commit_or_defer():
+    if g.get("idempotency_key_hash") is None:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+# Chạy fn(*args) sau khi thao tác ghi của request đã commit (vd xóa cache); ngay lập tức nếu không bị hoãn
+def after_commit(fn, *args):
+    callbacks = g.get("idempotency_after_commit")
+    if callbacks is None:
+        fn(*args)
+    else:
+        callbacks.append((fn, args))
+
+def _release(key_hash):
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(key_hash=key_hash).delete(synchronize_session=False)
+    db.session.commit()
+
+# Cho phép client gửi lại request an toàn với header Idempotency-Key: lần đầu chạy hàm xử lý và lưu
+# phản hồi (trừ lỗi 5xx), các lần sau trả lại đúng phản hồi đó bằng một lần tra khóa chính.
+# Hàm xử lý commit bằng commit_or_defer để phản hồi được lưu trong cùng transaction với thao tác ghi.
+# Key được tách theo user và endpoint, hết hạn sau ttl giây (mặc định IDEMPOTENCY_TTL).
+# Dùng sau jwt_required vì key gắn với user hiện tại.
+def idempotent(ttl=None):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return fn(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"message": f"{IDEMPOTENCY_HEADER} is too long"}), 400
+
+            identity = get_jwt_identity() or {}
+            scope = f"{identity.get('id')}:{request.method}:{request.path}:{key}"
+            key_hash = _sha256(scope.encode("utf-8"))
+            request_hash = _sha256(request.get_data())
+
+            early = _acquire(key_hash, request_hash, ttl or current_app.config["IDEMPOTENCY_TTL"])
+            if early is not None:
+                return early
+
+            g.idempotency_key_hash = key_hash
+            g.idempotency_after_commit = callbacks = []
+            try:
+                response = make_response(fn(*args, **kwargs))
+            except Exception:
+                _release(key_hash)
+                raise
+            finally:
+                g.pop("idempotency_key_hash", None)
+                g.pop("idempotency_after_commit", None)
+
+            if response.status_code >= 500 or response.is_streamed:
+                _release(key_hash)
+                return response
+
+            try:
+                IdempotencyKey.query.filter_by(key_hash=key_hash).update({
+                    "status_code": response.status_code,
+                    "response_body": response.get_data(as_text=True),
+                    "mimetype": response.mimetype
+                }, synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                _release(key_hash)
+                raise
+            for callback, callback_args in callbacks:
+                callback(*callback_args)
+            response.headers[REPLAY_HEADER] = "false"
+            return response
+        return decorator
+    return wrapper
+
+# Xóa hàng loạt các key đã hết hạn
+def purge_expired_idempotency_keys():
+    count = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
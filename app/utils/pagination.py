@@ -0,0 +1,77 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_, DateTime
+
+Page = namedtuple("Page", ["items", "per_page", "next_cursor", "total"])
+
+def get_page_args(default_limit=10, max_limit=100):
+    limit = request.args.get("limit", default_limit, type=int)
+    limit = min(max(limit, 1), max_limit)
+    cursor = request.args.get("cursor")
+    with_total = request.args.get("include_total", "false").lower() == "true"
+    return limit, cursor, with_total
+
+def is_paginated_request():
+    return "limit" in request.args or "cursor" in request.args
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+# Giải mã cursor thành giá trị của các cột sắp xếp, ValueError nếu cursor không hợp lệ
+def decode_cursor(cursor, columns):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+    decoded = []
+    for column, value in zip(columns, values):
+        if isinstance(column.type, DateTime):
+            if not isinstance(value, str):
+                raise ValueError("Invalid cursor")
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, (int, float, str)):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+def _after(columns, values, descending):
+    conditions = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        conditions.append(and_(*equal, beyond))
+    return or_(*conditions)
+
+# Phân trang theo khóa (keyset): trang sâu tốn chi phí như trang đầu, không dùng OFFSET.
+# columns phải xác định thứ tự duy nhất (cột cuối thường là id); tổng số chỉ đếm khi with_total.
+def keyset_paginate(query, columns, limit, cursor=None, descending=False, with_total=False):
+    after = decode_cursor(cursor, columns)
+    page_query = query
+    if after is not None:
+        page_query = page_query.filter(_after(columns, after, descending))
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = page_query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    total = query.order_by(None).count() if with_total else None
+    return Page(rows, limit, next_cursor, total)
+
+def page_response(page, items_key, items):
+    result = {items_key: items, "per_page": page.per_page, "next_cursor": page.next_cursor}
+    if page.total is not None:
+        result["total"] = page.total
+    return result
@@ -0,0 +1,33 @@
+from flask import current_app, stream_with_context
+from app.extensions import db
+
+# Đọc query theo từng lô dựa trên khóa tăng dần (keyset) thay vì giữ cursor phía server,
+# để giữa các lô vẫn chạy được truy vấn khác trên cùng kết nối (MySQL không cho phép khi đang stream)
+def iter_batches(query, column, batch_size=500):
+    last_key = None
+    while True:
+        batch_query = query
+        if last_key is not None:
+            batch_query = batch_query.filter(column > last_key)
+        rows = batch_query.order_by(column).limit(batch_size).all()
+        if not rows:
+            return
+        last_key = getattr(rows[-1], column.key)
+        yield rows
+        db.session.expunge_all()
+        if len(rows) < batch_size:
+            return
+
+# Trả về mảng JSON được sinh dần từ generator; wrap_key bọc mảng trong object {wrap_key: [...]}
+def stream_json_array(items, wrap_key=None):
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield "[" if wrap_key is None else "{" + dumps(wrap_key) + ": ["
+        first = True
+        for item in items:
+            yield dumps(item) if first else "," + dumps(item)
+            first = False
+        yield "]" if wrap_key is None else "]}"
+
+    return current_app.response_class(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,145 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# Benchmark đồng thời, mặc định chạy trên một file SQLite tạm, không đụng DB thật.
+#   orders:    nhiều luồng cùng mua một sản phẩm có tồn kho giới hạn, kiểm tra không bán vượt tồn kho.
+#   discounts: hàng trăm người cùng thu thập một mã có max_users, mỗi người thử nhiều lần,
+#              kiểm tra không vượt max_users, không thu thập trùng và collected_count khớp số bản ghi.
+parser = argparse.ArgumentParser(description="Concurrent order placement / discount collection benchmark")
+parser.add_argument("--scenario", choices=["orders", "discounts"], default="orders")
+parser.add_argument("--threads", type=int, default=None, help="mặc định: 50 (orders), 300 (discounts)")
+parser.add_argument("--orders-per-thread", type=int, default=4, help="số request mỗi luồng")
+parser.add_argument("--stock", type=int, default=100)
+parser.add_argument("--quantity", type=int, default=1)
+parser.add_argument("--max-users", type=int, default=100)
+parser.add_argument("--database-uri", default=None, help="mặc định: file SQLite tạm")
+args = parser.parse_args()
+if args.threads is None:
+    args.threads = 300 if args.scenario == "discounts" else 50
+
+os.environ["DATABASE_URI"] = args.database_uri or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from app.extensions import db
+from datetime import datetime, timedelta
+from app.models import Category, Discount, Product, User, UserDiscount, UserRole
+
+app = create_app()
+
+
+def create_users():
+    users = [
+        User(email=f"bench{i}-{time.time()}@example.com", password_hash="-", role=UserRole.customer)
+        for i in range(args.threads)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    return [
+        create_access_token(identity={"id": user.id, "role": user.role.value})
+        for user in users
+    ]
+
+
+def setup():
+    category = Category(name=f"bench-{time.time()}")
+    db.session.add(category)
+    db.session.flush()
+    product = Product(name="bench product", price=10, stock=args.stock, category_id=category.id)
+    db.session.add(product)
+    db.session.commit()
+    return product.id, create_users()
+
+
+def setup_discount():
+    discount = Discount(
+        code=f"BENCH{int(time.time() * 1000)}",
+        discount_percent=10,
+        expiration_date=datetime.utcnow() + timedelta(days=1),
+        max_users=args.max_users
+    )
+    db.session.add(discount)
+    db.session.commit()
+    return discount.id, create_users()
+
+
+# Chạy send(headers) song song trên mỗi token, đếm 201/400/lỗi khác và đo độ trễ
+def hammer(tokens, send):
+    client = app.test_client()
+    results = {"created": 0, "rejected": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(token):
+        headers = {"Authorization": f"Bearer {token}"}
+        for _ in range(args.orders_per_thread):
+            started = time.perf_counter()
+            response = send(client, headers)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code == 201:
+                    results["created"] += 1
+                elif response.status_code == 400:
+                    results["rejected"] += 1
+                else:
+                    results["errors"] += 1
+
+    threads = [threading.Thread(target=worker, args=(token,)) for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_time = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"requests: {len(latencies)} in {total_time:.2f}s ({len(latencies) / total_time:.1f} req/s)")
+    print(f"p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"created: {results['created']}, rejected: {results['rejected']}, errors: {results['errors']}")
+    return results
+
+
+def run_orders():
+    with app.app_context():
+        product_id, tokens = setup()
+
+    results = hammer(tokens, lambda client, headers: client.post("/api/order/create", headers=headers, json={
+        "order_items": [{"product_id": product_id, "quantity": args.quantity}]
+    }))
+
+    with app.app_context():
+        final_stock = db.session.get(Product, product_id).stock
+
+    sold = results["created"] * args.quantity
+    print(f"initial stock: {args.stock}, sold: {sold}, final stock: {final_stock}")
+
+    assert final_stock >= 0, "stock went negative"
+    assert final_stock == args.stock - sold, "stock does not match created orders"
+    print("OK: no overselling")
+
+
+def run_discounts():
+    with app.app_context():
+        discount_id, tokens = setup_discount()
+
+    results = hammer(tokens, lambda client, headers: client.post(f"/api/discount/collect/{discount_id}", headers=headers))
+
+    with app.app_context():
+        collected_count = db.session.get(Discount, discount_id).collected_count
+        rows = UserDiscount.query.filter_by(discount_id=discount_id).count()
+        distinct_users = db.session.query(UserDiscount.user_id).filter_by(discount_id=discount_id).distinct().count()
+
+    print(f"max users: {args.max_users}, collected_count: {collected_count}, rows: {rows}, distinct users: {distinct_users}")
+
+    assert rows <= args.max_users, "max_users exceeded"
+    assert rows == distinct_users, "a user collected the discount twice"
+    assert collected_count == rows == results["created"], "collected_count does not match collected rows"
+    print("OK: max_users respected")
+
+
+if __name__ == "__main__":
+    run_discounts() if args.scenario == "discounts" else run_orders()
@@ -0,0 +1,39 @@
+"""add composite indexes for admin order filters
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-17 23:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_order_status_created_at', 'order', ['status', 'created_at']),
+    ('ix_order_user_id_created_at', 'order', ['user_id', 'created_at']),
+    ('ix_order_item_product_id', 'order_item', ['product_id']),
+]
+
+
+def _existing_indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+# Bảng được tạo bằng db.create_all nên CSDL mới đã có sẵn các index này; chỉ tạo khi còn thiếu
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,48 @@
+"""add discount.collected_count and unique user_discount(user_id, discount_id)
+
+Revision ID: 8b4e6d2c1a37
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 00:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2c1a37'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+UNIQUE_INDEX = 'uq_user_discount_user_id_discount_id'
+
+
+# Giống revision trước: CSDL tạo bằng db.create_all có thể đã có sẵn cột và index
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'collected_count' not in {column['name'] for column in inspector.get_columns('discount')}:
+        op.add_column('discount', sa.Column('collected_count', sa.Integer(), nullable=False, server_default='0'))
+
+    if UNIQUE_INDEX not in {index['name'] for index in inspector.get_indexes('user_discount')}:
+        # Giữ lại bản ghi đầu tiên của mỗi cặp (user_id, discount_id) trước khi thêm ràng buộc unique
+        op.execute(
+            'DELETE FROM user_discount WHERE id NOT IN ('
+            'SELECT id FROM (SELECT MIN(id) AS id FROM user_discount GROUP BY user_id, discount_id) AS keep)'
+        )
+        op.create_index(UNIQUE_INDEX, 'user_discount', ['user_id', 'discount_id'], unique=True)
+
+    op.execute(
+        'UPDATE discount SET collected_count = '
+        '(SELECT COUNT(*) FROM user_discount WHERE user_discount.discount_id = discount.id)'
+    )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if UNIQUE_INDEX in {index['name'] for index in inspector.get_indexes('user_discount')}:
+        op.drop_index(UNIQUE_INDEX, table_name='user_discount')
+    if 'collected_count' in {column['name'] for column in inspector.get_columns('discount')}:
+        with op.batch_alter_table('discount') as batch_op:
+            batch_op.drop_column('collected_count')
@@ -0,0 +1,78 @@
+"""add daily sales rollup tables
+
+Revision ID: c5d7e9f1a2b4
+Revises: 8b4e6d2c1a37
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d7e9f1a2b4'
+down_revision = '8b4e6d2c1a37'
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+# Giống các revision trước: CSDL tạo bằng db.create_all có thể đã có sẵn các bảng này.
+# Sau khi nâng cấp, chạy `flask backfill-daily-rollups` để tính số liệu từ các đơn đã hoàn thành.
+def upgrade():
+    tables = _existing_tables()
+
+    if 'daily_sales' not in tables:
+        op.create_table(
+            'daily_sales',
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('order_count', sa.Integer(), nullable=False),
+            sa.Column('units', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('date')
+        )
+
+    if 'daily_product_sales' not in tables:
+        op.create_table(
+            'daily_product_sales',
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('units', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('date', 'product_id')
+        )
+        op.create_index('ix_daily_product_sales_product_id', 'daily_product_sales', ['product_id'], unique=False)
+
+    if 'daily_category_sales' not in tables:
+        op.create_table(
+            'daily_category_sales',
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('category_id', sa.Integer(), nullable=False),
+            sa.Column('units', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['category_id'], ['category.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('date', 'category_id')
+        )
+        op.create_index('ix_daily_category_sales_category_id', 'daily_category_sales', ['category_id'], unique=False)
+
+    if 'daily_discount_usage' not in tables:
+        op.create_table(
+            'daily_discount_usage',
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('discount_id', sa.Integer(), nullable=False),
+            sa.Column('usage_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('date', 'discount_id')
+        )
+        op.create_index('ix_daily_discount_usage_discount_id', 'daily_discount_usage', ['discount_id'], unique=False)
+
+
+def downgrade():
+    tables = _existing_tables()
+    for table in ('daily_discount_usage', 'daily_category_sales', 'daily_product_sales', 'daily_sales'):
+        if table in tables:
+            op.drop_table(table)
@@ -0,0 +1,56 @@
+"""store legacy order line prices as line totals
+
+Revision ID: e2a4c6b8d0f1
+Revises: c5d7e9f1a2b4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import os
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a4c6b8d0f1'
+down_revision = 'c5d7e9f1a2b4'
+branch_labels = None
+depends_on = None
+
+order = sa.table('order', sa.column('id', sa.Integer), sa.column('created_at', sa.DateTime))
+order_item = sa.table(
+    'order_item',
+    sa.column('order_id', sa.Integer),
+    sa.column('quantity', sa.Integer),
+    sa.column('price', sa.Float),
+    sa.column('discount_id', sa.Integer)
+)
+
+
+def _legacy_lines(cutoff):
+    legacy_orders = sa.select(order.c.id).where(
+        sa.or_(order.c.created_at.is_(None), order.c.created_at < cutoff)
+    )
+    return order_item.update().where(
+        order_item.c.discount_id.is_(None),
+        order_item.c.quantity > 1,
+        order_item.c.order_id.in_(legacy_orders)
+    )
+
+
+def _cutoff():
+    cutoff = os.getenv('ORDER_LINE_PRICE_CUTOFF')
+    return datetime.fromisoformat(cutoff) if cutoff else datetime.utcnow()
+
+
+# Trước khi sửa cách tính giá, dòng đơn không dùng mã giảm giá lưu đơn giá thay vì thành tiền.
+# Nhân các dòng đó với số lượng cho các đơn tạo trước mốc: mặc định là lúc chạy migration
+# (chạy trước khi code mới nhận đơn), hoặc ORDER_LINE_PRICE_CUTOFF (ISO) nếu code mới đã chạy trước đó.
+# Order.total_price (số tiền đã tính cho khách) giữ nguyên. Sau đó chạy `flask backfill-daily-rollups`.
+def upgrade():
+    op.execute(_legacy_lines(_cutoff()).values(price=order_item.c.price * order_item.c.quantity))
+
+
+# Trả về đơn giá như cách code cũ lưu, để nâng cấp lại không nhân hai lần
+def downgrade():
+    op.execute(_legacy_lines(_cutoff()).values(price=order_item.c.price / order_item.c.quantity))
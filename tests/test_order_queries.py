@@ -0,0 +1,139 @@
+import os
+import tempfile
+
+# Cấu hình phải được đặt trước khi import app: app.config đọc biến môi trường lúc import
+# và load_dotenv không ghi đè biến đã có, nên test luôn chạy trên một file SQLite tạm
+_DB_DIR = tempfile.mkdtemp(prefix="estore-test-")
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(_DB_DIR, "test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key-with-enough-length")
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import Category, Order, OrderItem, OrderStatus, Product, ProductImage, User, UserRole
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ITEMS_PER_ORDER = 3
+
+
+@pytest.fixture(scope="module")
+def app():
+    cwd = os.getcwd()
+    os.chdir(ROOT_DIR)
+    try:
+        app = create_app()
+    finally:
+        os.chdir(cwd)
+    app.config["TESTING"] = True
+
+    with app.app_context():
+        category = Category(name="Chairs")
+        db.session.add(category)
+        db.session.flush()
+        for i in range(ITEMS_PER_ORDER):
+            product = Product(name=f"Chair {i}", price=10 + i, stock=1000, category_id=category.id)
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(ProductImage(product_id=product.id, image_url=f"/uploads/{product.id}.png", is_default=True))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def customer(app):
+    with app.app_context():
+        count = User.query.count()
+        user = User(username=f"customer{count}", email=f"customer{count}@example.com",
+                    password_hash="x", full_name="Customer")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def auth_header(app, user_id, role):
+    with app.app_context():
+        token = create_access_token(identity={"id": user_id, "role": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def admin_header(app):
+    with app.app_context():
+        admin = User.query.filter_by(role=UserRole.admin).first()
+        return auth_header(app, admin.id, UserRole.admin.value)
+
+
+def add_orders(app, user_id, count):
+    with app.app_context():
+        product_ids = [product_id for (product_id,) in db.session.query(Product.id).order_by(Product.id).all()]
+        for _ in range(count):
+            order = Order(user_id=user_id, total_price=0, status=OrderStatus.pending)
+            db.session.add(order)
+            db.session.flush()
+            for product_id in product_ids:
+                db.session.add(OrderItem(order_id=order.id, product_id=product_id, quantity=1, price=10))
+        db.session.commit()
+
+
+def count_queries(app, client, url, headers):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+        body = response.get_json()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 200
+    return len(statements), body
+
+
+def order_count(body):
+    return len(body["orders"] if isinstance(body, dict) else body)
+
+
+@pytest.mark.parametrize("query", ["", "?limit=200"])
+def test_order_list_query_count_does_not_grow_with_orders(app, client, customer, query):
+    headers = auth_header(app, customer, UserRole.customer.value)
+    url = "/api/order/list" + query
+
+    add_orders(app, customer, 10)
+    small, body = count_queries(app, client, url, headers)
+    assert order_count(body) == 10
+
+    add_orders(app, customer, 90)
+    large, body = count_queries(app, client, url, headers)
+    assert order_count(body) == 100
+    assert all(len(order["items"]) == ITEMS_PER_ORDER for order in (body["orders"] if query else body))
+
+    assert small == large
+
+
+@pytest.mark.parametrize("query", ["", "&limit=200"])
+def test_admin_order_list_query_count_does_not_grow_with_orders(app, client, customer, query):
+    headers = admin_header(app)
+    url = f"/api/order/admin/list?user_id={customer}" + query
+
+    add_orders(app, customer, 10)
+    small, body = count_queries(app, client, url, headers)
+    assert order_count(body) == 10
+
+    add_orders(app, customer, 90)
+    large, body = count_queries(app, client, url, headers)
+    assert order_count(body) == 100
+
+    assert small == large